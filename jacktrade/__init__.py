@@ -5,18 +5,49 @@ from .benchmark import CodeTimer
 from .buffers import StringBuffers
 from .collections import (
     BaseMapping,
+    BidirectionalMapping,
+    BoundedCache,
+    CacheStats,
+    CompactMapping,
+    LFUCache,
+    LRUCache,
     MasterDict,
     Permutations,
+    TTLCache,
     chunkify,
+    flatten,
     flatten_dict,
     flatten_list,
     get_first_dict_item,
     get_first_dict_key,
     get_first_dict_value,
     ichunkify,
+    iflatten,
+    iflatten_dict,
+    iflatten_list,
     limit_iterator,
+    memoize,
+    prefetch_chunks,
+    unflatten_dict,
 )
 from .files import merge_csv_files
-from .multicore import do_multicore_work
-from .pickler import pickle_object, unpickle_object
+from .multicore import (
+    FailedTask,
+    WorkStats,
+    available_cpus,
+    do_multicore_work,
+    limit_threads,
+    numa_nodes,
+    pmap_chunks,
+    sweep,
+)
+from .pickler import (
+    append_pickle,
+    disk_cache,
+    iter_unpickle,
+    pickle_object,
+    pickle_objects,
+    unpickle_object,
+    unpickle_objects,
+)
 from .sysenv import hibernate, in_virtual_environment, restart, shutdown, suspend
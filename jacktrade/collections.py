@@ -1,29 +1,191 @@
-from itertools import chain, islice, product
-from typing import Any, Callable, Hashable, Iterable, Iterator, Optional, TypeVar
+import array
+import inspect
+import queue
+import random
+import sys
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import Mapping, MutableMapping, Sequence
+from concurrent.futures import Future
+from contextlib import suppress
+from functools import wraps
+from itertools import accumulate, compress, count, islice, product
+from math import prod
+from operator import attrgetter, itemgetter
+from types import MappingProxyType
+from typing import (
+    Any,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    TypeVar,
+)
+
+# ---------------------------------------------------------------------------
+# CONSTANTS
+# ---------------------------------------------------------------------------
+# Iterable types which flatten and iflatten treat as leaves by default
+ATOMIC_TYPES = (str, bytes, bytearray, memoryview)
+# Orders cache accesses across all caches, used to find the least recently used entry
+_access_clock = count()
+# Separates positional from keyword arguments in memoize cache keys
+_KWARGS_MARK = object()
+# Getters which BaseMapping applies to all items at once, without a Python loop
+_FAST_GETTERS = (itemgetter, attrgetter)
+# Methods of choosing a subset of combinations with Permutations.sample
+SAMPLING_METHODS = ("random", "lhs", "halton")
 
 
 # ---------------------------------------------------------------------------
 # DICTIONARIES
 # ---------------------------------------------------------------------------
-def _flatten_dict(input_data: dict, output_data: list, max_depth: int) -> None:
+def _iflatten(
+    input_data: Any,
+    max_depth: int,
+    is_container: Callable[[Any], bool],
+    get_children: Callable[[Any], Iterable],
+    get_leaves: Optional[Callable[[Any, int], Optional[Iterable]]] = None,
+) -> Iterator:
     """
-    Flattens a nested dict and returns the values inside output_data list.
-    Recursion happens until a non-dict item is encountered, or max_depth is reached.
+    Yields the leaves of a nested structure in depth-first order. Descends into items
+    for which is_container returns True, until a leaf is encountered or max_depth
+    is reached. Uses an explicit stack of iterators instead of recursion, so the
+    depth of the structure is not limited by the recursion limit.
+
+    get_leaves optionally receives a container and the remaining depth, and may
+    return all the leaves of that container at once to skip descending into it.
     """
-    if isinstance(input_data, dict) and (max_depth > 0):
-        for data in input_data.values():
-            _flatten_dict(data, output_data, max_depth - 1)
-    else:
-        output_data.append(input_data)
+    if not (is_container(input_data) and max_depth > 0):
+        yield input_data
+        return
+    if get_leaves and (leaves := get_leaves(input_data, max_depth)) is not None:
+        yield from leaves
+        return
+    stack = [iter(get_children(input_data))]
+    while stack:
+        for data in stack[-1]:
+            if is_container(data) and len(stack) < max_depth:
+                depth = max_depth - len(stack)
+                if get_leaves and (leaves := get_leaves(data, depth)) is not None:
+                    yield from leaves
+                    continue
+                stack.append(iter(get_children(data)))
+                break  # Continue with the children of data
+            yield data
+        else:  # All items at this level are exhausted
+            stack.pop()
+
+
+def _iflatten_paths(
+    input_data: Any,
+    max_depth: int,
+    is_container: Callable[[Any], bool],
+    get_items: Callable[[Any], Iterable[tuple[Hashable, Any]]],
+) -> Iterator[tuple[tuple, Any]]:
+    """
+    Same as _iflatten, but yields (key_path, leaf) pairs, where key_path is a tuple
+    of keys leading from input_data to the leaf. get_items returns (key, child) pairs.
+    """
+    if not (is_container(input_data) and max_depth > 0):
+        yield (), input_data
+        return
+    stack = [((), iter(get_items(input_data)))]
+    while stack:
+        path, items = stack[-1]
+        for key, data in items:
+            if is_container(data) and len(stack) < max_depth:
+                stack.append(((*path, key), iter(get_items(data))))
+                break  # Continue with the children of data
+            yield (*path, key), data
+        else:  # All items at this level are exhausted
+            stack.pop()
 
 
-def flatten_dict(input_data: dict, max_depth: int = 999) -> list:
+def _is_dict(data: Any) -> bool:
+    """Returns True if data is a dict."""
+    return isinstance(data, dict)
+
+
+def iflatten_dict(
+    input_data: dict,
+    max_depth: int = 999,
+    key_paths: bool = False,
+    separator: Optional[str] = None,
+) -> Iterator:
+    """
+    Flattens a nested dict and lazily yields its values.
+    Descends until a non-dict item is encountered, or max_depth is reached.
+
+    Parameters:
+        - input_data: The dict to flatten.
+        - max_depth: Maximum number of nested dicts to descend into.
+        - key_paths: If True, yields (key_path, value) pairs instead of values, where
+                     key_path is a tuple of keys leading to the value.
+        - separator: If provided, yields (key_path, value) pairs where key_path is
+                     a string of keys joined by the separator, e.g. "a.b.c".
+    """
+    if not key_paths and separator is None:
+        return _iflatten(input_data, max_depth, _is_dict, dict.values)
+    items = _iflatten_paths(input_data, max_depth, _is_dict, dict.items)
+    if separator is None:
+        return items
+    return ((separator.join(map(str, path)), value) for path, value in items)
+
+
+def flatten_dict(
+    input_data: dict,
+    max_depth: int = 999,
+    key_paths: bool = False,
+    separator: Optional[str] = None,
+) -> list | dict:
     """
     Flattens a nested dict and returns the values inside a list.
-    Recursion happens until a non-dict item is encountered, or max_depth is reached.
+    Descends until a non-dict item is encountered, or max_depth is reached.
+
+    If key_paths=True or a separator is provided, returns a flat dict mapping key
+    paths to values instead, which unflatten_dict turns back into the nested dict.
+    See iflatten_dict for a description of the parameters.
     """
-    output_data = []
-    _flatten_dict(input_data, output_data, max_depth)
+    items = iflatten_dict(input_data, max_depth, key_paths, separator)
+    if not key_paths and separator is None:
+        return list(items)
+    return dict(items)
+
+
+def unflatten_dict(
+    input_data: dict | Iterable[tuple[Any, Any]], separator: Optional[str] = None
+) -> dict:
+    """
+    Rebuilds a nested dict from a flat dict, or an iterable of (key_path, value)
+    pairs, as returned by flatten_dict or iflatten_dict with key paths.
+
+    Parameters:
+        - input_data: Flat dict or pairs, where key paths are tuples of keys.
+        - separator: If provided, key paths are strings of keys joined by the
+                     separator, which are split into keys. Keys are then strings.
+    """
+    output_data = {}
+    items = input_data.items() if isinstance(input_data, dict) else input_data
+    for path, value in items:
+        if separator is not None:
+            path = path.split(separator)
+        if not path:
+            raise ValueError("Key paths must not be empty.")
+        node = output_data
+        for depth, key in enumerate(path[:-1], 1):
+            node = node.setdefault(key, {})
+            if not isinstance(node, dict):
+                raise ValueError(
+                    f"Key path {path} conflicts with a value at {path[:depth]}."
+                )
+        node[path[-1]] = value
     return output_data
 
 
@@ -42,6 +204,332 @@ def get_first_dict_value(dictionary: dict) -> Any:
     return next(iter(dictionary.values()), None)
 
 
+class CacheStats(NamedTuple):
+    """
+    Usage statistics of a cache.
+
+    Attributes:
+        - hits: Number of lookups which found the key.
+        - misses: Number of lookups which did not find the key, or found it expired.
+        - evictions: Number of entries evicted or expired.
+        - size: Number of entries.
+        - nbytes: Total size of the values in bytes.
+    """
+
+    hits: int | None
+    misses: int | None
+    evictions: int | None
+    size: int
+    nbytes: int | None
+
+    @property
+    def hit_rate(self) -> float | None:
+        """Fraction of lookups which found the key, or None if there were none."""
+        if not self.hits and not self.misses:
+            return None
+        return self.hits / (self.hits + self.misses)
+
+
+class BoundedCache(MutableMapping, ABC):
+    """
+    Base class of dict-like caches which evict entries to stay within maxsize entries
+    and maxbytes bytes. Subclasses implement the eviction policy by keeping track of
+    the order of entries and choosing the entry to evict.
+
+    Looking up a key with [] or get() counts as an access to the entry, while
+    checking for a key with "in" or reading items() and values() does not.
+
+    Individual operations are thread-safe, but iterating over the cache is not.
+    """
+
+    def __init__(
+        self,
+        maxsize: int | None = None,
+        maxbytes: int | None = None,
+        getsizeof: Callable[[Any], int] = sys.getsizeof,
+    ) -> None:
+        """
+        Parameters:
+            - maxsize: Maximum number of entries, or None for no limit.
+            - maxbytes: Maximum total size of the values in bytes, or None for no limit.
+            - getsizeof: A function returning the size of a value in bytes. Defaults
+                         to sys.getsizeof, which does not include referenced objects.
+        """
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.nbytes = 0  # Total size of the values
+        self._getsizeof = getsizeof
+        self._data = {}
+        self._sizes = {}
+        self._accessed = {}  # Access clock reading of each key
+        self._master = None  # MasterDict enforcing a shared memory budget
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    def _on_insert(self, key: Hashable) -> None:
+        """Records a new key."""
+
+    @abstractmethod
+    def _on_access(self, key: Hashable) -> None:
+        """Records an access to an existing key."""
+
+    def _on_update(self, key: Hashable) -> None:
+        """Records setting a new value of an existing key."""
+        self._on_access(key)
+
+    @abstractmethod
+    def _on_delete(self, key: Hashable) -> None:
+        """Forgets a deleted key."""
+
+    @abstractmethod
+    def _victim(self) -> Hashable:
+        """Returns the key which should be evicted next. The cache is not empty."""
+
+    def _expired(self, key: Hashable) -> bool:
+        """Returns True if the entry must not be returned anymore."""
+        return False
+
+    def victim_rank(self) -> float:
+        """
+        Returns the access clock reading of the entry which would be evicted next,
+        or -inf if it has expired, or inf if the cache is empty. A MasterDict evicts
+        from the cache with the lowest rank to stay within its memory budget.
+        """
+        with self._lock:
+            if not self._data:
+                return float("inf")
+            key = self._victim()
+            return float("-inf") if self._expired(key) else self._accessed[key]
+
+    def evict(self) -> tuple[Hashable, Any]:
+        """
+        Evicts the entry chosen by the eviction policy and returns it as a pair.
+        Raises KeyError if the cache is empty.
+        """
+        with self._lock:
+            if not self._data:
+                raise KeyError("Cannot evict from an empty cache.")
+            key = self._victim()
+            self.evictions += 1
+            return key, self.pop(key)
+
+    def stats(self) -> CacheStats:
+        """Returns the usage statistics of the cache."""
+        return CacheStats(
+            self.hits, self.misses, self.evictions, len(self._data), self.nbytes
+        )
+
+    def _shrink(self, entries: int = 0, nbytes: int = 0) -> None:
+        """
+        Evicts entries until the cache is within its limits, with room for the given
+        number of additional entries and bytes.
+        """
+        while self._data and (
+            (self.maxsize is not None and len(self._data) + entries > self.maxsize)
+            or (self.maxbytes is not None and self.nbytes + nbytes > self.maxbytes)
+        ):
+            self.evict()
+
+    def __getitem__(self, key: Hashable) -> Any:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            if self._expired(key):
+                self.misses += 1
+                self.evictions += 1
+                del self[key]
+                raise KeyError(key)
+            self.hits += 1
+            self._accessed[key] = next(_access_clock)
+            self._on_access(key)
+            return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        size = self._getsizeof(value)
+        with self._lock:
+            exists = key in self._data
+            if exists:
+                self.nbytes -= self._sizes[key]
+            else:  # Evict before inserting, so that the new entry is not the victim
+                self._shrink(1, size)
+            self._data[key] = value
+            self._sizes[key] = size
+            self.nbytes += size
+            self._accessed[key] = next(_access_clock)
+            if exists:
+                self._on_update(key)
+            else:
+                self._on_insert(key)
+                if self._master is not None:
+                    self._master._index_key(self, key)
+            self._shrink()  # The new value may be too large
+        # Evicting from other caches must not happen while holding this cache's lock,
+        # since another cache may be evicting from this one at the same time
+        if self._master is not None:
+            self._master._enforce_budget()
+
+    def __delitem__(self, key: Hashable) -> None:
+        with self._lock:
+            del self._data[key]
+            self.nbytes -= self._sizes.pop(key)
+            del self._accessed[key]
+            self._on_delete(key)
+            if self._master is not None:
+                self._master._unindex_key(self, key)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data and not self._expired(key)
+
+    def __iter__(self) -> Iterator:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def items(self):
+        return self._data.items()
+
+    def values(self):
+        return self._data.values()
+
+    def pop(self, key: Hashable, *default: Any) -> Any:
+        """Removes the key and returns its value, without counting as an access."""
+        with self._lock:
+            if key not in self._data:
+                if default:
+                    return default[0]
+                raise KeyError(key)
+            value = self._data[key]
+            del self[key]
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._data):
+                del self[key]
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._data})"
+
+
+class LRUCache(BoundedCache):
+    """A cache which evicts the least recently used entry first."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        """See BoundedCache for a description of the parameters."""
+        super().__init__(*args, **kwargs)
+        self._order = OrderedDict()
+
+    def _on_insert(self, key: Hashable) -> None:
+        self._order[key] = None
+
+    def _on_access(self, key: Hashable) -> None:
+        self._order.move_to_end(key)
+
+    def _on_delete(self, key: Hashable) -> None:
+        del self._order[key]
+
+    def _victim(self) -> Hashable:
+        return next(iter(self._order))
+
+
+class LFUCache(BoundedCache):
+    """
+    A cache which evicts the least frequently used entry first, and the least
+    recently used one among equally frequently used entries. All operations are O(1).
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        """See BoundedCache for a description of the parameters."""
+        super().__init__(*args, **kwargs)
+        self._counts = {}  # Number of uses of each key
+        self._buckets = defaultdict(OrderedDict)  # Keys by number of uses
+        self._min_count = 0
+
+    def _on_insert(self, key: Hashable) -> None:
+        self._counts[key] = self._min_count = 1
+        self._buckets[1][key] = None
+
+    def _on_access(self, key: Hashable) -> None:
+        count = self._counts[key]
+        self._remove_from_bucket(key, count)
+        if self._min_count == count and count not in self._buckets:
+            self._min_count = count + 1
+        self._counts[key] = count + 1
+        self._buckets[count + 1][key] = None
+
+    def _on_delete(self, key: Hashable) -> None:
+        self._remove_from_bucket(key, self._counts.pop(key))
+
+    def _remove_from_bucket(self, key: Hashable, count: int) -> None:
+        """Removes the key from its bucket, deleting the bucket if empty."""
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+
+    def _victim(self) -> Hashable:
+        if self._min_count not in self._buckets:  # Outdated by deletions
+            self._min_count = min(self._buckets)
+        return next(iter(self._buckets[self._min_count]))
+
+
+class TTLCache(BoundedCache):
+    """
+    A cache whose entries expire ttl seconds after they were set. When full, the
+    oldest entry is evicted first. Expired entries are removed as new ones are set.
+    """
+
+    def __init__(
+        self, ttl: float, *args, timer: Callable[[], float] = time.monotonic, **kwargs
+    ) -> None:
+        """
+        Parameters:
+            - ttl: Number of seconds after which an entry expires.
+            - timer: A function returning the current time in seconds.
+            - args, kwargs: See BoundedCache for a description of the parameters.
+        """
+        super().__init__(*args, **kwargs)
+        self.ttl = ttl
+        self._timer = timer
+        self._expires = OrderedDict()  # Expiry time of each key, in order of setting
+
+    def _on_insert(self, key: Hashable) -> None:
+        self.expire()
+        self._expires[key] = self._timer() + self.ttl
+
+    def _on_access(self, key: Hashable) -> None:
+        pass
+
+    def _on_update(self, key: Hashable) -> None:
+        del self._expires[key]
+        self._on_insert(key)
+
+    def _on_delete(self, key: Hashable) -> None:
+        del self._expires[key]
+
+    def _victim(self) -> Hashable:
+        return next(iter(self._expires))
+
+    def _expired(self, key: Hashable) -> bool:
+        return self._expires[key] <= self._timer()
+
+    def expire(self) -> None:
+        """Removes all expired entries."""
+        with self._lock:
+            now = self._timer()
+            while self._expires and next(iter(self._expires.values())) <= now:
+                self.evictions += 1
+                del self[next(iter(self._expires))]
+
+
 class MasterDict:
     """
     Holds multiple dicts and provides a simple method to delete keys and values from them all.
@@ -49,24 +537,133 @@ class MasterDict:
     This object is usually used to hold caches, which can then be reliably emptied with
     a single method call to prevent memory leaks.
 
+    Sub-dicts which are BoundedCache instances can additionally share a memory budget,
+    in which case entries are evicted from whichever cache holds the least recently
+    used entry until the total size of the caches is within the budget. Their keys
+    can also be indexed, so that deleting a key only touches the caches holding it.
+
     Despite the name, this class is not a dict subtype. However, it can be converted to a
     dict using as_dict() method.
     """
 
-    def __init__(self, **subdicts: dict) -> None:
+    # Attributes other than sub-dicts are kept out of vars()
+    __slots__ = ("__dict__", "_maxbytes", "_key_index", "_lock")
+
+    def __init__(
+        self,
+        *,
+        _maxbytes: int | None = None,
+        _index_keys: bool = False,
+        **subdicts: dict,
+    ) -> None:
         """
         Initialises the master dict with sub-dicts, which are provided as keyword
         arguments. Argument name is the dict name, while value is the dict object.
+
+        Names starting with an underscore are reserved for the options below, so that
+        any other name can be used for a sub-dict.
+
+        Parameters:
+            - _maxbytes: Memory budget in bytes shared by the BoundedCache sub-dicts,
+                         or None for no shared limit.
+            - _index_keys: If True, keeps track of which BoundedCache sub-dicts hold
+                           each key, so that delete_keys does not have to look for
+                           the keys in every cache. Other sub-dicts are always
+                           searched.
         """
+        if reserved := [name for name in subdicts if name.startswith("_")]:
+            raise TypeError(f"Sub-dict names must not start with '_': {reserved}")
+        self._maxbytes = _maxbytes
+        self._key_index = {} if _index_keys else None  # Caches by id(), by key
+        self._lock = threading.Lock()  # Guards the key index
         for attr, value in subdicts.items():
             setattr(self, attr, value)
 
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Adds a sub-dict, placing a BoundedCache under the shared memory budget."""
+        if name in vars(self):
+            self._detach(getattr(self, name))
+        super().__setattr__(name, value)
+        if isinstance(value, BoundedCache):
+            value._master = self
+            for key in value:
+                self._index_key(value, key)
+            self._enforce_budget()
+
+    def __delattr__(self, name: str) -> None:
+        """Removes a sub-dict."""
+        self._detach(getattr(self, name))
+        super().__delattr__(name)
+
+    def _detach(self, subdict: dict) -> None:
+        """Releases a BoundedCache which is no longer a sub-dict."""
+        if isinstance(subdict, BoundedCache):
+            for key in subdict:
+                self._unindex_key(subdict, key)
+            subdict._master = None
+
+    def _index_key(self, cache: BoundedCache, key: Hashable) -> None:
+        """Records that the cache holds the key."""
+        if self._key_index is not None:
+            with self._lock:
+                self._key_index.setdefault(key, {})[id(cache)] = cache
+
+    def _unindex_key(self, cache: BoundedCache, key: Hashable) -> None:
+        """Records that the cache no longer holds the key."""
+        if self._key_index is not None:
+            with self._lock:
+                caches = self._key_index[key]
+                del caches[id(cache)]
+                if not caches:
+                    del self._key_index[key]
+
+    @property
+    def nbytes(self) -> int:
+        """Total size in bytes of the values in BoundedCache sub-dicts."""
+        return sum(d.nbytes for d in self if isinstance(d, BoundedCache))
+
+    def _enforce_budget(self) -> None:
+        """Evicts the least valuable cache entries until the budget is met."""
+        if self._maxbytes is None:
+            return
+        caches = [d for d in self if isinstance(d, BoundedCache)]
+        nbytes = sum(cache.nbytes for cache in caches)
+        while nbytes > self._maxbytes and any(caches):
+            cache = min(caches, key=BoundedCache.victim_rank)
+            before = cache.nbytes
+            with suppress(KeyError):  # Emptied by another thread in the meantime
+                cache.evict()
+            nbytes -= before - cache.nbytes
+
     def delete_keys(self, *keys: Hashable) -> None:
         """Deletes provided keys from all sub-dictionaries where they are present."""
+        if self._key_index is None:
+            subdicts = list(self)
+        else:  # Indexed caches are looked up in the index instead
+            subdicts = [d for d in self if not isinstance(d, BoundedCache)]
         for key in keys:
-            for subdict in self:
+            if self._key_index is not None:
+                with self._lock:  # Caches lock the index while holding their locks
+                    caches = list(self._key_index.get(key, {}).values())
+                for cache in caches:
+                    cache.pop(key, None)  # Unless deleted in the meantime
+            for subdict in subdicts:
                 subdict.pop(key, None)
 
+    def stats(self) -> dict[str, CacheStats]:
+        """
+        Returns the usage statistics of each sub-dict by name. Only the sizes of
+        sub-dicts which are not BoundedCache instances are known.
+        """
+        return {
+            name: (
+                subdict.stats()
+                if isinstance(subdict, BoundedCache)
+                else CacheStats(None, None, None, len(subdict), None)
+            )
+            for name, subdict in vars(self).items()
+        }
+
     def clear_all(self) -> None:
         """Clears all sub-dicts."""
         for subdict in self:
@@ -92,53 +689,415 @@ class MasterDict:
         return iter(vars(self).values())
 
 
+def _memo_key(args: tuple, kwargs: dict) -> Hashable:
+    """
+    Makes a memoize cache key from function arguments. A single positional
+    argument which is not a tuple is its own key.
+    """
+    if len(args) == 1 and not kwargs and not isinstance(args[0], tuple):
+        return args[0]
+    if kwargs:
+        return (*args, _KWARGS_MARK, *sorted(kwargs.items()))
+    return args
+
+
+def memoize(
+    master: MasterDict = None,
+    name: str = None,
+    maxsize: int | None = None,
+    maxbytes: int | None = None,
+    ttl: float | None = None,
+) -> Callable[[Callable], Callable]:
+    """
+    Decorator which caches the results of a function in a bounded cache.
+
+    The cache is an LRUCache, or a TTLCache if ttl is provided, and is available
+    as the cache attribute of the decorated function. The decorated function is
+    thread-safe: concurrent calls with the same arguments compute the result only
+    once, while the others wait for it. Exceptions are not cached, but are raised
+    in all the waiting calls.
+
+    Calls with a single positional argument which is not a tuple are cached under
+    the argument itself, so they can be invalidated with master.delete_keys(arg).
+
+    Parameters:
+        - master: MasterDict to register the cache in, so that it shares the
+                  master's memory budget and can be cleared with it.
+        - name: Name of the cache in the master, function name by default.
+        - maxsize: Maximum number of cached results, unlimited if None.
+        - maxbytes: Maximum total size in bytes of cached results, unlimited if None.
+        - ttl: Number of seconds a result remains valid, forever if None.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        if ttl is None:
+            cache = LRUCache(maxsize, maxbytes)
+        else:
+            cache = TTLCache(ttl, maxsize, maxbytes)
+        if master is not None:
+            setattr(master, name or function.__name__, cache)
+        lock = threading.Lock()
+        in_flight = {}  # Futures of results being computed, by key
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            key = _memo_key(args, kwargs)
+            with lock:
+                try:
+                    return cache[key]
+                except KeyError:
+                    pass
+                future = in_flight.get(key)
+                owner = future is None
+                if owner:
+                    future = in_flight[key] = Future()
+            if not owner:
+                return future.result()
+            try:
+                result = function(*args, **kwargs)
+            except BaseException as error:
+                with lock:
+                    del in_flight[key]
+                future.set_exception(error)
+                raise
+            with lock:
+                cache[key] = result
+                del in_flight[key]
+            future.set_result(result)
+            return result
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
 # ---------------------------------------------------------------------------
 # ITERABLES
 # ---------------------------------------------------------------------------
-def _flatten_list(input_data: list, output_data: list, max_depth: int) -> None:
+def _is_list(data: Any) -> bool:
+    """Returns True if data is a list."""
+    return isinstance(data, list)
+
+
+def iflatten_list(input_data: list, max_depth: int = 999) -> Iterator:
     """
-    Flattens a multilevel list and returns the values inside output_data list.
-    Recursion happens until a non-list item is encountered, or max_depth is reached.
+    Flattens a multilevel list and lazily yields its values.
+    Descends until a non-list item is encountered, or max_depth is reached.
     """
-    if isinstance(input_data, list) and (max_depth > 0):
-        for data in input_data:
-            _flatten_list(data, output_data, max_depth - 1)
-    else:
-        output_data.append(input_data)
+    return _iflatten(input_data, max_depth, _is_list, iter)
 
 
 def flatten_list(input_data: list, max_depth: int = 999) -> list:
     """
     Flattens a multilevel list and returns the values inside a list.
-    Recursion happens until a non-list item is encountered, or max_depth is reached.
+    Descends until a non-list item is encountered, or max_depth is reached.
     """
-    output_data = []
-    _flatten_list(input_data, output_data, max_depth)
-    return output_data
+    return list(iflatten_list(input_data, max_depth))
+
+
+def _is_container(data: Any) -> bool:
+    """Returns True if data is iterable, but not one of ATOMIC_TYPES."""
+    return isinstance(data, Iterable) and not isinstance(data, ATOMIC_TYPES)
+
+
+def _get_children(data: Iterable) -> Iterable:
+    """Returns the values of a mapping, or the iterable itself."""
+    return data.values() if isinstance(data, Mapping) else data
 
 
-def chunkify(iterable: Iterable, chunk_size: int = None) -> Iterator[list]:
+def _ravel(data: Any, max_depth: int) -> Optional[Iterable]:
     """
-    Yields successive n-sized list chunks from an iterable.
-    Supports generator expressions.
+    Returns the elements of a NumPy array (or any object with the same interface)
+    flattened by ravel(), if its dimensions fit within max_depth and its elements
+    cannot be containers. Returns None otherwise.
+    """
+    if not 0 < getattr(data, "ndim", 0) <= max_depth or not hasattr(data, "ravel"):
+        return None
+    if getattr(getattr(data, "dtype", None), "kind", "O") == "O":
+        return None  # Elements may be containers themselves
+    return data.ravel()
+
+
+def iflatten(
+    input_data: Iterable,
+    max_depth: int = 999,
+    is_container: Callable[[Any], bool] = _is_container,
+) -> Iterator:
     """
+    Flattens arbitrarily nested containers and lazily yields their leaves.
+    Descends until a leaf is encountered, or max_depth is reached.
+
+    Parameters:
+        - input_data: The nested containers to flatten.
+        - max_depth: Maximum number of nested containers to descend into.
+        - is_container: A function accepting an item and returning True if it should
+                        be descended into. By default, any iterable (including
+                        tuples, sets, generators and arrays) is descended into,
+                        except for ATOMIC_TYPES such as str and bytes. The values
+                        of mappings are descended into, not their keys.
+
+    NumPy arrays are flattened with ravel() instead of descending into each of
+    their dimensions, unless they hold Python objects.
+    """
+    return _iflatten(input_data, max_depth, is_container, _get_children, _ravel)
+
+
+def flatten(
+    input_data: Iterable,
+    max_depth: int = 999,
+    is_container: Callable[[Any], bool] = _is_container,
+) -> list:
+    """
+    Flattens arbitrarily nested containers and returns their leaves inside a list.
+    See iflatten for a description of the parameters.
+    """
+    return list(iflatten(input_data, max_depth, is_container))
+
+
+def _is_sliceable(iterable: Iterable) -> bool:
+    """
+    Returns True if the iterable is a list, array.array, one-dimensional memoryview
+    or a NumPy array (or any object with the same interface).
+    """
+    if isinstance(iterable, (list, array.array)):
+        return True
+    if isinstance(iterable, memoryview):
+        return iterable.ndim == 1  # Multidimensional memoryviews cannot be sliced
+    return getattr(iterable, "ndim", 0) > 0 and hasattr(iterable, "__getitem__")
+
+
+def _slice_chunks(sequence: Any, chunk_size: int | None) -> Iterator:
+    """Yields successive n-sized slices of a sliceable sequence."""
+    if chunk_size is None:
+        chunk_size = len(sequence) or 1  # Range step must not be 0
+    elif not chunk_size:
+        return  # No chunks, like _islice_chunks
+    for start in range(0, len(sequence), chunk_size):
+        yield sequence[start : start + chunk_size]
+
+
+def _islice_chunks(iterable: Iterable, chunk_size: int | None) -> Iterator[list]:
+    """Yields successive n-sized list chunks from any iterable."""
     iterator = iter(iterable)  # Must be assigned here, else infinite loop
     while chunk := list(islice(iterator, chunk_size)):
         yield chunk
 
 
+def _pad_chunk(chunk: Any, chunk_size: int, fill_value: Any) -> Any:
+    """Returns a copy of the chunk extended to chunk_size items with fill_value."""
+    missing = chunk_size - len(chunk)
+    if isinstance(chunk, list):
+        return chunk + [fill_value] * missing
+    if isinstance(chunk, array.array):
+        return chunk + array.array(chunk.typecode, [fill_value] * missing)
+    if isinstance(chunk, memoryview):
+        raise TypeError("Chunks of a memoryview cannot be padded.")
+    padded = chunk.copy()  # A NumPy array
+    padded.resize((chunk_size, *chunk.shape[1:]), refcheck=False)
+    padded[len(chunk) :] = fill_value
+    return padded
+
+
+def chunkify(
+    iterable: Iterable,
+    chunk_size: int = None,
+    pad: bool = False,
+    fill_value: Any = None,
+    drop_last: bool = False,
+) -> Iterator:
+    """
+    Yields successive n-sized list chunks from an iterable.
+    Supports generator expressions.
+
+    Lists, array.array objects, memoryviews and NumPy arrays are sliced instead of
+    being iterated over item by item, and chunks are of the same type as the input.
+    Chunks of memoryviews and NumPy arrays are views sharing memory with the input.
+
+    Parameters:
+        - iterable: The iterable to chunk.
+        - chunk_size: Maximum number of items in each chunk, or None for one chunk.
+        - pad: If True, the last chunk is extended to chunk_size items with
+               fill_value, so that all chunks are of equal size. The last chunk
+               is then a copy, also for memoryviews (unsupported) and NumPy arrays.
+        - fill_value: The value the last chunk is padded with.
+        - drop_last: If True, the last chunk is discarded if it has fewer than
+                     chunk_size items, so that all chunks are of equal size.
+    """
+    if pad and drop_last:
+        raise ValueError("Chunks can be padded or dropped, but not both.")
+    if _is_sliceable(iterable):
+        chunks = _slice_chunks(iterable, chunk_size)
+    else:
+        chunks = _islice_chunks(iterable, chunk_size)
+    for chunk in chunks:
+        if chunk_size is not None and len(chunk) < chunk_size:
+            if drop_last:
+                return
+            if pad:
+                chunk = _pad_chunk(chunk, chunk_size, fill_value)
+        yield chunk
+
+
+class _ChunkSource:
+    """
+    Shares an iterator between the chunks yielded by ichunkify. Items are read from
+    the iterator under a lock. An item read on behalf of a later chunk, because the
+    chunk it belongs to has not been consumed yet, is buffered in that chunk.
+    """
+
+    def __init__(self, iterable: Iterable, chunk_size: int | None) -> None:
+        self._iterator = iter(iterable)
+        self._chunk_size = chunk_size or None  # 0 also means a single chunk
+        self._lock = threading.Lock()
+        self._chunks = weakref.WeakValueDictionary()  # Unreferenced chunks are skipped
+        self.position = 0  # Number of items read from the iterator
+        self.length = None  # Total number of items, once the iterator is exhausted
+
+    def _read(self) -> tuple[int, Any]:
+        """
+        Reads the next item and returns it with the index of the chunk it belongs to.
+        Raises StopIteration if the iterator is exhausted.
+        """
+        if self.length is not None:
+            raise StopIteration
+        try:
+            item = next(self._iterator)
+        except StopIteration:
+            self.length = self.position
+            raise
+        index = self.position // self._chunk_size if self._chunk_size else 0
+        self.position += 1
+        return index, item
+
+    def _buffer(self, index: int, item: Any) -> None:
+        """Buffers the item in its chunk, unless the chunk is no longer referenced."""
+        if (chunk := self._chunks.get(index)) is not None:
+            chunk.buffer.append(item)
+
+    def new_chunk(self, index: int) -> Optional["_Chunk"]:
+        """Returns the chunk with the given index, or None if it would be empty."""
+        if index and self._chunk_size is None:  # The first chunk holds all items
+            return None
+        with self._lock:
+            self._chunks[index] = chunk = _Chunk(self, index, self._chunk_size)
+            try:
+                while self.position <= chunk.start:  # Until its first item is read
+                    self._buffer(*self._read())
+            except StopIteration:
+                return None
+            return chunk
+
+    def next_item(self, chunk: "_Chunk") -> Any:
+        """Returns the next item of the chunk, raising StopIteration at its end."""
+        with self._lock:
+            if chunk.buffer:
+                return chunk.buffer.popleft()
+            if chunk.stop is not None and self.position >= chunk.stop:
+                raise StopIteration
+            # Items of earlier chunks were read when this chunk was created
+            return self._read()[1]
+
+
+class _Chunk(Iterator):
+    """A chunk yielded by ichunkify. See ichunkify for a description."""
+
+    def __init__(self, source: _ChunkSource, index: int, size: int | None) -> None:
+        self._source = source
+        self.index = index
+        self.start = index * size if size else 0
+        self._stop = None if size is None else self.start + size
+        self.buffer = deque()
+
+    @property
+    def stop(self) -> int | None:
+        """Position in the iterable after the last item of the chunk, if known."""
+        if self._source.length is None:
+            return self._stop
+        return min(self._source.length, self._stop or self._source.length)
+
+    def __next__(self) -> Any:
+        return self._source.next_item(self)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(index={self.index}, start={self.start})"
+
+
 def ichunkify(iterable: Iterable, chunk_size: int = None) -> Iterator[Iterator]:
     """
     Yields successive n-sized iterator chunks from an iterable.
     Supports generator expressions.
 
-    WARNING!:   Chunks must be consumed as they are yielded, otherwise
-                the results will not be as expected!
+    Chunks can be consumed in any order, partially, or concurrently from multiple
+    threads. Items are read from the iterable only when needed, so no memory is used
+    for buffering when chunks are consumed in the order they are yielded. Items of
+    a chunk are buffered only when a later chunk is consumed first, and are discarded
+    if the chunk is no longer referenced.
+
+    Each chunk is an iterator with the following attributes:
+        - index: Index of the chunk, starting at 0.
+        - start: Position of the first item of the chunk in the iterable.
+        - stop: Position after the last item of the chunk, or None if the chunk
+                extends to the end of the iterable which has not been reached yet.
     """
-    iterator = iter(iterable)
-    chunk_size_minus_one = None if (chunk_size is None) else (chunk_size - 1)
-    for first_chunk_elem in iterator:
-        yield chain([first_chunk_elem], islice(iterator, chunk_size_minus_one))
+    source = _ChunkSource(iterable, chunk_size)
+    for index in count():
+        if (chunk := source.new_chunk(index)) is None:
+            return
+        yield chunk
+
+
+def prefetch_chunks(
+    iterable: Iterable, chunk_size: int = None, depth: int = 2
+) -> Iterator[list]:
+    """
+    Yields successive n-sized list chunks from an iterable, like chunkify, while
+    a background thread reads the following chunks ahead of time. Reading a slow
+    source, such as a file or a network stream, then overlaps with processing
+    the chunks. Exceptions raised by the iterable are re-raised when reached.
+
+    Parameters:
+        - iterable: The iterable to chunk. It is consumed by the background thread.
+        - chunk_size: Maximum number of items in each chunk, or None for one chunk.
+        - depth: Maximum number of chunks read ahead, bounding the memory used.
+    """
+    if depth < 1:
+        raise ValueError(f"Depth must be at least 1, got {depth}.")
+    chunks = queue.Queue(maxsize=depth)  # Holds (chunk, error) pairs
+    stopped = threading.Event()
+
+    def put(chunk: list | None, error: Exception | None = None) -> bool:
+        """Puts the pair into the queue, unless the consumer has stopped."""
+        if stopped.is_set():
+            return False
+        chunks.put((chunk, error))
+        return True
+
+    def read_ahead() -> None:
+        """Puts chunks into the queue until the iterable or the consumer stops."""
+        try:
+            for chunk in chunkify(iterable, chunk_size):
+                if not put(chunk):
+                    return
+            put(None)  # Marks the end
+        except Exception as error:
+            put(None, error)
+
+    threading.Thread(target=read_ahead, name="prefetch_chunks", daemon=True).start()
+    try:
+        while True:
+            chunk, error = chunks.get()
+            if error is not None:
+                raise error
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        stopped.set()
+        # Unblock the reader if it is waiting for space, so that it can stop
+        with suppress(queue.Empty):
+            while True:
+                chunks.get_nowait()
 
 
 def limit_iterator(iterable: Iterable, limit: int = None) -> Iterator:
@@ -158,10 +1117,62 @@ def limit_iterator(iterable: Iterable, limit: int = None) -> Iterator:
 T = TypeVar("T")
 
 
+def _build_mapping(
+    mapping: dict,
+    items: Iterable,
+    key_getter: Callable,
+    value_getter: Callable,
+    condition: Optional[Callable],
+    skip_exceptions: tuple[type[Exception]],
+) -> None:
+    """Adds the keys and values obtained from the items to an empty mapping."""
+    if (
+        type(key_getter) in _FAST_GETTERS
+        and type(value_getter) in _FAST_GETTERS
+        and type(mapping).__setitem__ is dict.__setitem__
+    ):
+        # Fast path: keys and values are obtained and inserted without running any
+        # Python code per item. If an item has to be skipped, the mapping is rebuilt
+        # from scratch below, which inserts the same keys in the same order.
+        if not isinstance(items, (list, tuple)):
+            items = list(items)  # Iterated over twice
+        try:
+            selected = items if condition is None else list(filter(condition, items))
+            dict.update(
+                mapping, zip(map(key_getter, selected), map(value_getter, selected))
+            )
+            return
+        except skip_exceptions:
+            pass
+    for item in items:
+        try:
+            if condition is None or condition(item):
+                mapping[key_getter(item)] = value_getter(item)
+        except skip_exceptions:
+            pass
+
+
+class _MappingBuilder:
+    """Builds a partial mapping from a chunk of items, in a worker."""
+
+    def __init__(self, *getters) -> None:
+        self._getters = getters  # key_getter, value_getter, condition, skip_exceptions
+
+    def __call__(self, chunk: list) -> dict:
+        mapping = {}
+        _build_mapping(mapping, chunk, *self._getters)
+        return mapping
+
+
 class BaseMapping(dict):
     """
     Base mapping where each key and value are obtained by applying a getter to
     each item in the iterable.
+
+    When the key and value getters are operator.itemgetter or operator.attrgetter
+    objects, the mapping is built in a single pass without a Python loop, which is
+    much faster for large numbers of items. If an item has to be skipped, the
+    mapping is then rebuilt item by item.
     """
 
     def __init__(
@@ -171,6 +1182,8 @@ class BaseMapping(dict):
         value_getter: Callable[[T], Any],
         condition: Optional[Callable[[T], bool]] = None,
         skip_exceptions: tuple[type[Exception]] = (),
+        chunk_size: int | None = None,
+        **kwargs,
     ) -> None:
         """
         Parameters:
@@ -181,13 +1194,54 @@ class BaseMapping(dict):
                          indicating if the item should be included in the mapping.
             - skip_exceptions: A tuple of exceptions which, if they appear during the
                                mapping construction, discard that item instead of raising.
+            - chunk_size: If provided, the items are split into chunks of this size,
+                          which are mapped in parallel using pmap_chunks and merged in
+                          order. The getters must be picklable for the "process" backend.
+            - kwargs: Passed to pmap_chunks, e.g. backend and max_workers.
         """
-        for item in items:
-            try:
-                if condition is None or condition(item):
-                    self[key_getter(item)] = value_getter(item)
-            except skip_exceptions:
-                pass
+        if chunk_size is None:
+            _build_mapping(
+                self, items, key_getter, value_getter, condition, skip_exceptions
+            )
+            return
+        from .multicore import pmap_chunks  # multicore imports this module
+
+        builder = _MappingBuilder(key_getter, value_getter, condition, skip_exceptions)
+        for mapping in pmap_chunks(builder, items, chunk_size, **kwargs):
+            if type(self).__setitem__ is dict.__setitem__:
+                dict.update(self, mapping)
+            else:
+                for key, value in mapping.items():
+                    self[key] = value
+
+    @classmethod
+    def from_columns(
+        cls, keys: Iterable[Hashable], values: Iterable, mask: Iterable[bool] = None
+    ) -> "BaseMapping":
+        """
+        Creates a mapping from a column of keys and a column of values, such as lists
+        or NumPy arrays, without calling the constructor of the class.
+
+        Parameters:
+            - keys: Keys of the mapping.
+            - values: Values of the mapping, in the same order as the keys.
+            - mask: Column of booleans indicating which keys and values to include.
+        """
+        # NumPy arrays are converted to lists of Python objects, which is much
+        # faster than iterating over them
+        keys, values, mask = (
+            column.tolist() if hasattr(column, "tolist") else column
+            for column in (keys, values, mask)
+        )
+        pairs = zip(keys, values)
+        if mask is not None:
+            pairs = compress(pairs, mask)
+        mapping = cls.__new__(cls)
+        if cls.__setitem__ is dict.__setitem__:
+            dict.update(mapping, pairs)
+        else:
+            mapping.update(pairs)
+        return mapping
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({dict(self)})"
@@ -216,9 +1270,296 @@ class BaseMapping(dict):
         return inverse_mapping
 
 
+class BidirectionalMapping(BaseMapping):
+    """
+    BaseMapping whose values are unique, which maintains the inverse mapping of values
+    to keys as it is modified. Inverse lookups therefore do not rebuild the inverse.
+
+    Mapping a value which is already mapped from another key raises ValueError, which
+    can be added to skip_exceptions to discard such items during construction.
+    """
+
+    def __new__(cls, *args, **kwargs) -> "BidirectionalMapping":
+        # The inverse is created here, because unpickling and from_columns
+        # insert items without calling __init__
+        mapping = super().__new__(cls)
+        mapping._inverse = {}
+        return mapping
+
+    @property
+    def inverse(self) -> Mapping:
+        """Read-only view of the inverse mapping of values to keys."""
+        return MappingProxyType(self._inverse)
+
+    def invert(self, strict: bool = False) -> dict:
+        """
+        Returns a copy of the inverse mapping of values to keys. Values are always
+        unique, so strict mode has no effect.
+        """
+        return dict(self._inverse)
+
+    def __setitem__(self, key: Hashable, value: Hashable) -> None:
+        if value in self._inverse and self._inverse[value] != key:
+            raise ValueError(
+                f"Value {value!r} is already mapped from key {self._inverse[value]!r}."
+            )
+        if key in self:
+            del self._inverse[dict.__getitem__(self, key)]
+        dict.__setitem__(self, key, value)
+        self._inverse[value] = key
+
+    def __delitem__(self, key: Hashable) -> None:
+        del self._inverse[dict.pop(self, key)]
+
+    def __ior__(self, other: Mapping) -> "BidirectionalMapping":
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key: Hashable, default: Hashable = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key: Hashable, *default) -> Any:
+        if key not in self:
+            return dict.pop(self, key, *default)
+        value = dict.pop(self, key)
+        del self._inverse[value]
+        return value
+
+    def popitem(self) -> tuple[Hashable, Any]:
+        key, value = dict.popitem(self)
+        del self._inverse[value]
+        return key, value
+
+    def clear(self) -> None:
+        dict.clear(self)
+        self._inverse.clear()
+
+
+def _int_array(items: list[int]) -> array.array:
+    """
+    Returns an array of the ints using the smallest item size which fits them all.
+    Raises OverflowError if they do not fit into 64 bits.
+    """
+    low, high = min(items, default=0), max(items, default=0)
+    for typecode in "bhiq":
+        limit = 1 << array.array(typecode).itemsize * 8 - 1
+        if -limit <= low and high < limit:
+            return array.array(typecode, items)
+    raise OverflowError("Ints do not fit into 64 bits.")
+
+
+class _StringColumn(Sequence):
+    """Immutable sequence of strings stored as a single UTF-8 encoded buffer."""
+
+    def __init__(self, strings: Iterable[str]) -> None:
+        encoded = [string.encode() for string in strings]
+        self._offsets = _int_array(list(accumulate(map(len, encoded), initial=0)))
+        self._data = b"".join(encoded)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("String column index out of range.")
+        return self._data[self._offsets[index] : self._offsets[index + 1]].decode()
+
+    def __iter__(self) -> Iterator[str]:
+        data, offsets = self._data, self._offsets
+        return (data[start:stop].decode() for start, stop in zip(offsets, offsets[1:]))
+
+
+def _compact_column(items: list) -> Sequence:
+    """
+    Stores the items in a compact column if they are all ints fitting into 64 bits,
+    all floats or all strings. Returns the list itself otherwise.
+    """
+    types = set(map(type, items))
+    if types == {int}:
+        with suppress(OverflowError):
+            return _int_array(items)
+    elif types == {float}:
+        return array.array("d", items)
+    elif types == {str}:
+        return _StringColumn(items)
+    return items
+
+
+class CompactMapping(Mapping):
+    """
+    Read-only mapping with the same constructor as BaseMapping, which stores its keys
+    and values in columns sorted by the hashes of the keys instead of a hash table.
+    Keys are looked up by binary search of their hash.
+
+    Columns of ints, floats or strings do not hold a Python object per item, so
+    such mappings take several times less memory than a dict. Other keys and
+    values are stored in lists. Keys are iterated over in the order of their hashes.
+    """
+
+    def __init__(
+        self,
+        items: Iterable[T],
+        key_getter: Callable[[T], Hashable],
+        value_getter: Callable[[T], Any],
+        condition: Optional[Callable[[T], bool]] = None,
+        skip_exceptions: tuple[type[Exception]] = (),
+        chunk_size: int | None = None,
+        **kwargs,
+    ) -> None:
+        """
+        Parameters:
+            See BaseMapping.
+        """
+        mapping = BaseMapping(
+            items,
+            key_getter,
+            value_getter,
+            condition,
+            skip_exceptions,
+            chunk_size,
+            **kwargs,
+        )
+        self._set_columns(list(mapping), list(mapping.values()))
+
+    def _set_columns(self, keys: list, values: list) -> None:
+        """Sorts the unique keys and their values by hash and stores them in columns."""
+        hashes = list(map(hash, keys))
+        order = sorted(range(len(keys)), key=hashes.__getitem__)
+        self._keys = _compact_column([keys[i] for i in order])
+        self._values = _compact_column([values[i] for i in order])
+        hashes = array.array("q", [hashes[i] for i in order])
+        # Most ints are their own hashes, in which case the keys are reused
+        self._hashes = self._keys if hashes == self._keys else hashes
+
+    @classmethod
+    def from_columns(
+        cls, keys: Iterable[Hashable], values: Iterable, mask: Iterable[bool] = None
+    ) -> "CompactMapping":
+        """
+        Creates a mapping from a column of keys and a column of values, such as lists
+        or NumPy arrays, without calling the constructor of the class. If a key is
+        repeated, its last value is used.
+
+        Parameters:
+            - keys: Keys of the mapping.
+            - values: Values of the mapping, in the same order as the keys.
+            - mask: Column of booleans indicating which keys and values to include.
+        """
+        mapping = BaseMapping.from_columns(keys, values, mask)
+        compact_mapping = cls.__new__(cls)
+        compact_mapping._set_columns(list(mapping), list(mapping.values()))
+        return compact_mapping
+
+    def __reduce__(self) -> tuple:
+        # Hashes of strings differ between processes, so they are not pickled
+        return self.__class__.from_columns, (self._keys, self._values)
+
+    def _index(self, key: Hashable) -> int:
+        """Returns the index of the key in the key column, or -1 if it is absent."""
+        key_hash = hash(key)
+        hashes, keys = self._hashes, self._keys
+        index = bisect_left(hashes, key_hash)
+        while index < len(hashes) and hashes[index] == key_hash:
+            if keys[index] == key:
+                return index
+            index += 1
+        return -1
+
+    def __getitem__(self, key: Hashable) -> Any:
+        index = self._index(key)
+        if index < 0:
+            raise KeyError(key)
+        return self._values[index]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._index(key) >= 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self) -> Iterator:
+        return iter(self._keys)
+
+    def get_many(self, keys: Iterable[Hashable], default: Any = None) -> list:
+        """
+        Returns a list of the values of the keys, such as a list or a NumPy array,
+        with the default value for missing keys.
+        """
+        if hasattr(keys, "tolist"):
+            keys = keys.tolist()
+        index, values = self._index, self._values
+        return [values[i] if i >= 0 else default for i in map(index, keys)]
+
+    def invert(self, strict: bool = False) -> dict:
+        """
+        Returns an inverse mapping of values to keys.
+
+        When strict=True, ValueError is raised if the values cannot be unambiguously
+        mapped to keys because they are not unique.
+        """
+        return BaseMapping.invert(self, strict)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({dict(self)})"
+
+
 # ---------------------------------------------------------------------------
 # COMBINATORICS
 # ---------------------------------------------------------------------------
+def _latin_hypercube(n: int, dimensions: int, rng: random.Random) -> list[tuple]:
+    """
+    Returns n points in the unit hypercube, such that each of the n equal intervals
+    of each dimension contains exactly one point.
+    """
+    columns = []
+    for _ in range(dimensions):
+        column = [(i + rng.random()) / n for i in range(n)]
+        rng.shuffle(column)
+        columns.append(column)
+    return list(zip(*columns)) if columns else [()] * n
+
+
+def _primes(count: int) -> list[int]:
+    """Returns the first count prime numbers."""
+    primes = []
+    candidate = 2
+    while len(primes) < count:
+        if all(candidate % prime for prime in primes):
+            primes.append(candidate)
+        candidate += 1
+    return primes
+
+
+def _halton(n: int, dimensions: int, rng: random.Random) -> list[tuple]:
+    """
+    Returns the first n points of the Halton low-discrepancy sequence in the unit
+    hypercube, randomly shifted in each dimension (Cranley-Patterson rotation).
+    """
+    bases = _primes(dimensions)
+    shifts = [rng.random() for _ in bases]
+    points = []
+    for i in range(1, n + 1):
+        point = []
+        for base, shift in zip(bases, shifts):
+            # Radical inverse: mirrors the digits of i in the base around the point
+            inverse, scale, rest = 0.0, 1.0, i
+            while rest:
+                rest, digit = divmod(rest, base)
+                scale /= base
+                inverse += digit * scale
+            point.append((inverse + shift) % 1.0)
+        points.append(tuple(point))
+    return points
+
+
 class Permutations:
     """
     Yields all possible combinations of the named input parameters,
@@ -235,17 +1576,203 @@ class Permutations:
         # {"a": 2, "b": "B"}
         # ...
     ```
+
+    Combinations are not stored, but computed from their index when needed. They can
+    be accessed by index (p[3] returns {"a": 2, "b": "B"}), and slicing returns the
+    Permutations of the selected combinations (p[1::2] has 3 combinations), which
+    makes it possible to split a large grid of parameters into disjoint parts.
+    Similarly, sample() returns Permutations of a subset of the combinations.
+
+    Invalid combinations can be excluded with constraints, which are checked as soon
+    as the values of the parameters they depend on are chosen:
+    ```py
+    p = Permutations(fast=[5, 10, 20], slow=[10, 20, 50], step=[1, 2])
+    p = p.where(lambda fast, slow: fast < slow)
+    len(p)  # Returns: 12
+    ```
     """
 
     def __init__(self, **kwargs: Iterable):
         self._kwargs = kwargs
         self._names = tuple(kwargs.keys())
-        self._combinations = tuple(product(*kwargs.values()))
+        # Ranges are immutable and take no memory, so they are not copied
+        self._values = tuple(
+            values if isinstance(values, (tuple, range)) else tuple(values)
+            for values in kwargs.values()
+        )
+        total = 1
+        for values in self._values:
+            total *= len(values)
+        # Indices of the selected combinations in the full grid, in ascending order
+        # unless the Permutations are a reversed slice. None if the combinations are
+        # the valid combinations of the full grid, which have not been listed yet.
+        self._indices = range(total)
+        self._length = total
+        # Constraints as (function, parameter names) pairs, grouped by the position of
+        # the last parameter they depend on
+        self._constraints = tuple(() for _ in self._names)
+
+    def _combination(self, index: int) -> tuple:
+        """
+        Returns the combination at the index of the full grid, which is decoded as a
+        mixed-radix number whose digits are the indices of the parameter values.
+        """
+        combination = []
+        for values in reversed(self._values):
+            index, digit = divmod(index, len(values))
+            combination.append(values[digit])
+        return tuple(reversed(combination))
+
+    def _combinations(self) -> Iterator[tuple]:
+        """Yields the combinations as tuples."""
+        if self._indices is None:
+            return map(self._combination, self._valid_indices())
+        if self._indices == range(prod(map(len, self._values))):
+            return product(*self._values)  # Full grid
+        return map(self._combination, self._indices)
+
+    def _copy(self, indices: Sequence[int] | None) -> "Permutations":
+        """Returns Permutations of the combinations at the indices of the full grid."""
+        permutations = self.__class__.__new__(self.__class__)
+        permutations.__dict__.update(vars(self))
+        permutations._indices = indices
+        permutations._length = None if indices is None else len(indices)
+        return permutations
+
+    def _selected(self) -> Sequence[int]:
+        """Returns the indices of the selected combinations, listing them if needed."""
+        if self._indices is None:
+            self._indices = _int_array(list(self._valid_indices()))
+        return self._indices
+
+    def _is_valid(self, index: int) -> bool:
+        """Checks whether the combination at the index satisfies all constraints."""
+        kwargs = dict(zip(self._names, self._combination(index)))
+        return all(
+            constraint(**{name: kwargs[name] for name in names})
+            for constraints in self._constraints
+            for constraint, names in constraints
+        )
+
+    def _valid_prefixes(self) -> tuple[Iterator[int], int]:
+        """
+        Returns the indices of the valid combinations of the constrained parameters,
+        in the grid of those parameters only, and the number of combinations of the
+        remaining parameters, each of which completes a prefix to a valid combination.
+
+        Parameters are chosen depth-first, and a choice which violates a constraint
+        is discarded together with all combinations starting with it.
+        """
+        constrained = [i for i, c in enumerate(self._constraints) if c]
+        depth = constrained[-1] + 1 if constrained else 0
+        suffix_size = prod(map(len, self._values[depth:]))
+        kwargs = {}
+
+        def visit(position: int, prefix: int) -> Iterator[int]:
+            if position == depth:
+                yield prefix
+                return
+            name, values = self._names[position], self._values[position]
+            for digit, value in enumerate(values):
+                kwargs[name] = value
+                if all(
+                    constraint(**{name: kwargs[name] for name in names})
+                    for constraint, names in self._constraints[position]
+                ):
+                    yield from visit(position + 1, prefix * len(values) + digit)
+
+        return visit(0, 0), suffix_size
+
+    def _valid_indices(self) -> Iterator[int]:
+        """Yields the indices of the valid combinations of the full grid, in order."""
+        prefixes, suffix_size = self._valid_prefixes()
+        for prefix in prefixes:
+            yield from range(prefix * suffix_size, (prefix + 1) * suffix_size)
+
+    def where(self, *constraints: Callable[..., bool]) -> "Permutations":
+        """
+        Returns Permutations of the combinations which satisfy all the constraints.
+
+        Each constraint is a function whose arguments are named after the parameters
+        it depends on, which returns False for invalid combinations. It is checked
+        as soon as the values of these parameters are chosen, so that combinations
+        which start with an invalid choice are never produced. Constraints should
+        therefore preferably depend on the parameters listed first.
+        """
+        grouped = [list(c) for c in self._constraints]
+        for constraint in constraints:
+            names = tuple(inspect.signature(constraint).parameters)
+            if not names or not set(names) <= set(self._names):
+                raise ValueError(
+                    f"Constraint arguments {names} must be parameter names."
+                )
+            position = max(map(self._names.index, names))
+            grouped[position].append((constraint, names))
+        full_grid = range(prod(map(len, self._values)))
+        constrained = self._copy(None if self._indices == full_grid else self._indices)
+        constrained._constraints = tuple(map(tuple, grouped))
+        if constrained._indices is not None:
+            # The combinations are already listed, so they are simply filtered
+            constrained._indices = _int_array(
+                list(filter(constrained._is_valid, constrained._indices))
+            )
+            constrained._length = len(constrained._indices)
+        return constrained
+
+    def sample(
+        self, n: int, seed: Hashable = None, method: str = "random"
+    ) -> "Permutations":
+        """
+        Returns Permutations of a subset of n combinations, in the order of the full
+        grid, without enumerating all the combinations.
+
+        Parameters:
+            - n: Number of combinations to choose. All combinations are returned if
+                 there are not as many.
+            - seed: Seed of the random number generator, for reproducible samples.
+            - method: How to choose the combinations:
+                - "random": Uniformly at random, without replacement.
+                - "lhs": Latin hypercube sampling. The values of each parameter are
+                         chosen equally often (give or take one), while their
+                         combinations are random.
+                - "halton": Points of the Halton low-discrepancy sequence, which
+                            cover the grid more evenly than random combinations.
+
+        The "lhs" and "halton" methods may choose the same combination more than
+        once, in which case fewer than n combinations are returned. The same applies
+        to combinations which are not selected by these Permutations, such as those
+        outside of a slice.
+        """
+        if method not in SAMPLING_METHODS:
+            raise ValueError(
+                f"Method must be one of {SAMPLING_METHODS}, got {method!r}."
+            )
+        rng = random.Random(seed)
+        if method == "random":
+            indices = rng.sample(self._selected(), min(n, len(self)))
+        else:
+            sampler = _latin_hypercube if method == "lhs" else _halton
+            if self._indices is None:
+                selected = self._is_valid
+            elif isinstance(self._indices, range):
+                selected = self._indices.__contains__
+            else:
+                selected = set(self._indices).__contains__
+            indices = set()
+            for point in sampler(n, len(self._values), rng):
+                index = 0
+                for u, values in zip(point, self._values):
+                    # Rounding can make u * len(values) equal len(values)
+                    digit = min(int(u * len(values)), len(values) - 1)
+                    index = index * len(values) + digit
+                if selected(index):
+                    indices.add(index)
+        return self._copy(sorted(indices))
 
     @property
     def args(self) -> list[tuple]:
         """Lists all combinations as tuples (positional arguments)."""
-        return list(self._combinations)
+        return list(self._combinations())
 
     @property
     def kwargs(self) -> list[dict[str, Any]]:
@@ -256,11 +1783,28 @@ class Permutations:
         """
         Yields a kwarg dictionary with all possible combinations of input parameters.
         """
-        for values in self._combinations:
-            yield dict(zip(self._names, values))
+        names = self._names
+        for values in self._combinations():
+            yield dict(zip(names, values))
+
+    def __getitem__(self, index: int | slice) -> "dict[str, Any] | Permutations":
+        """
+        Returns the kwarg dictionary of the combination at the index, or Permutations
+        of the combinations selected by the slice.
+        """
+        if isinstance(index, slice):
+            return self._copy(self._selected()[index])
+        return dict(zip(self._names, self._combination(self._selected()[index])))
 
     def __len__(self) -> int:
-        return len(self._combinations)
+        """
+        Returns the number of combinations. For constrained Permutations, only the
+        valid combinations of the constrained parameters need to be enumerated.
+        """
+        if self._length is None:
+            prefixes, suffix_size = self._valid_prefixes()
+            self._length = sum(1 for _ in prefixes) * suffix_size
+        return self._length
 
     def __repr__(self) -> str:
-        return f"{self.__class__.__name__}({self._kwargs}"
+        return f"{self.__class__.__name__}({self._kwargs})"
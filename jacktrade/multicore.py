@@ -1,24 +1,572 @@
+import asyncio
 import concurrent.futures
+import csv
+import heapq
+import inspect
+import json
 import multiprocessing as mp
-from itertools import zip_longest
-from typing import Any, Callable, Iterable
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import partial
+from glob import glob
+from itertools import cycle, islice, takewhile, zip_longest
+from typing import Any, Callable, Hashable, Iterable, Iterator, NamedTuple
+
+from .benchmark import NS_PER_SECOND, CodeTimer
+from .collections import Permutations, prefetch_chunks
+from .pickler import append_pickle, iter_unpickle
+
+# ---------------------------------------------------------------------------
+# CONSTANTS
+# ---------------------------------------------------------------------------
+# Environment variables controlling the size of thread pools spawned by
+# native numerical libraries (OpenMP, OpenBLAS, MKL, Accelerate, numexpr)
+THREAD_LIMIT_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+NUMA_NODES_DIR = "/sys/devices/system/node"
+BACKENDS = ("process", "thread", "asyncio")
+LATENCY_WINDOW = 10_000  # How many of the most recent task latencies to keep
+
+
+# ---------------------------------------------------------------------------
+# CLASSES
+# ---------------------------------------------------------------------------
+class FailedTask(NamedTuple):
+    """A task which do_multicore_work could not complete, even after retrying."""
+
+    args: tuple
+    kwargs: dict
+    error: BaseException
+    attempts: int
+
+
+class WorkStats(NamedTuple):
+    """
+    A snapshot of do_multicore_work progress.
+
+    Attributes:
+        - done: Number of tasks which have finished, successfully or not.
+        - failed: Number of tasks which have failed on their final attempt.
+        - total: Total number of tasks, or None if unknown.
+        - running: Number of tasks currently executing.
+        - waiting: Number of tasks waiting to be retried.
+        - max_workers: Maximum number of concurrently running tasks.
+        - elapsed: Seconds since the work started.
+        - throughput: Finished tasks per second.
+        - utilization: Fraction of the available worker time spent executing tasks.
+        - worker_utilization: Maps the worker number to its utilization.
+        - latency_p50: Median duration of recent successful tasks in seconds.
+        - latency_p99: 99th percentile duration of recent successful tasks in seconds.
+        - eta: Estimated seconds until all work is done, or None if unknown.
+
+    NOTE:   If running < max_workers while work remains, the workers are starved by
+            the input iterables. If utilization is high, the workers are saturated.
+    """
+
+    done: int
+    failed: int
+    total: int | None
+    running: int
+    waiting: int
+    max_workers: int
+    elapsed: float
+    throughput: float
+    utilization: float
+    worker_utilization: dict[int, float]
+    latency_p50: float | None
+    latency_p99: float | None
+    eta: float | None
+
+
+class _Task(NamedTuple):
+    """A unit of work submitted to the pool."""
+
+    index: int
+    args: tuple
+    kwargs: dict
+    attempt: int = 1
+
+
+class _Checkpoint:
+    """
+    An append-only journal of successfully completed tasks, used to resume
+    interrupted work. Each entry is a pickled (task index, result) tuple, where
+    the result is only stored if requested.
+    """
+
+    def __init__(self, filename: str, store_results: bool) -> None:
+        self._filename = filename
+        self._store_results = store_results
+        self.results = {}  # Task index -> result
+        if os.path.exists(filename):
+            # Drop a partially written entry left behind by a crash
+            self.results.update(iter_unpickle(filename, repair=True))
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def record(self, index: int, result: Any) -> None:
+        """Records a successfully completed task."""
+        entry = (index, result if self._store_results else None)
+        append_pickle(entry, self._filename)
+
+    def skip_completed(
+        self,
+        tasks: Iterator[_Task],
+        worker_done_callback: Callable[[concurrent.futures.Future], Any] | None,
+    ) -> Iterator[_Task]:
+        """
+        Yields tasks which have not been completed yet. If results are stored, completed
+        tasks are reported to the callback with their stored results instead.
+        """
+        for task in tasks:
+            if task.index not in self.results:
+                yield task
+            elif self._store_results and worker_done_callback:
+                worker_done_callback(_completed_future(self.results[task.index]))
+
+
+class _TimedResult(NamedTuple):
+    """The return value of a worker wrapped by _TimedWorker."""
+
+    value: Any
+    time_ns: int
+    worker_key: Hashable
+
+
+class _TimedWorker:
+    """Wraps the worker to measure the task duration and identify the worker running it."""
+
+    def __init__(self, worker: Callable) -> None:
+        self._worker = worker
+
+    def __call__(self, *args, **kwargs) -> _TimedResult:
+        with CodeTimer(no_print=True) as timer:
+            value = self._worker(*args, **kwargs)
+        return _TimedResult(value, timer.ns, (os.getpid(), threading.get_ident()))
+
+
+class _IndexedWorker:
+    """Wraps the worker to return the index of the chunk it processed with the result."""
+
+    def __init__(self, worker: Callable) -> None:
+        self._worker = worker
+
+    def __call__(self, index: int, chunk: list) -> tuple[int, Any]:
+        return index, self._worker(chunk)
+
+
+class _SweepWorker:
+    """Wraps the function to time each run of a parameter sweep."""
+
+    def __init__(self, function: Callable) -> None:
+        self._function = function
+
+    def __call__(self, index: int, params: dict) -> tuple[int, Any, float]:
+        with CodeTimer(no_print=True) as timer:
+            result = self._function(**params)
+        return index, result, timer.s
+
+
+class _SweepOutput:
+    """
+    Writes the rows of a parameter sweep to a CSV file if the filename ends with
+    ".csv", or appends them to a file of pickled rows otherwise.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self._filename = filename
+        self._writer = None
+        if filename.lower().endswith(".csv"):
+            self._file = open(filename, "w", newline="")
+        else:
+            self._file = None
+            open(filename, "wb").close()  # Rows are appended to an empty file
+
+    def write(self, row: dict) -> None:
+        """Writes the row, flushing it to the file."""
+        if self._file is None:
+            append_pickle(row, self._filename)
+            return
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._file, fieldnames=list(row))
+            self._writer.writeheader()
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+class _ProgressTracker:
+    """Collects task timings and periodically reports WorkStats."""
+
+    def __init__(
+        self,
+        total: int | None,
+        max_workers: int,
+        progress_callback: Callable[[WorkStats], Any] | None,
+        stats_file: str | None,
+        stats_interval: float,
+    ) -> None:
+        self._total = total
+        self._max_workers = max_workers
+        self._progress_callback = progress_callback
+        self._stats_file = stats_file
+        self._stats_interval = stats_interval
+        self._start_time = time.monotonic()
+        self._busy_ns = defaultdict(int)  # Worker number -> time spent on tasks
+        self._worker_numbers = {}  # Worker key -> worker number
+        self._latencies_ns = deque(maxlen=LATENCY_WINDOW)
+        self.next_report_time = self._start_time + stats_interval
+        self.done = 0
+        self.failed = 0
+
+    def record_run(self, worker_key: Hashable, time_ns: int) -> None:
+        """Records a successful execution of a task by the worker."""
+        number = self._worker_numbers.setdefault(worker_key, len(self._worker_numbers))
+        self._busy_ns[number] += time_ns
+        self._latencies_ns.append(time_ns)
+
+    def record_done(self, failed: bool) -> None:
+        """Records a task which has finished for good."""
+        self.done += 1
+        self.failed += failed
+
+    def snapshot(self, running: int, waiting: int) -> WorkStats:
+        """Returns the current statistics."""
+        elapsed = time.monotonic() - self._start_time
+        elapsed_ns = max(elapsed * NS_PER_SECOND, 1)
+        throughput = self.done / elapsed if elapsed > 0 else 0.0
+        latencies = sorted(self._latencies_ns)
+        if self._total is not None and throughput > 0:
+            eta = max(self._total - self.done, 0) / throughput
+        else:
+            eta = None
+        return WorkStats(
+            done=self.done,
+            failed=self.failed,
+            total=self._total,
+            running=running,
+            waiting=waiting,
+            max_workers=self._max_workers,
+            elapsed=elapsed,
+            throughput=throughput,
+            utilization=sum(self._busy_ns.values()) / (elapsed_ns * self._max_workers),
+            worker_utilization={n: t / elapsed_ns for n, t in self._busy_ns.items()},
+            latency_p50=self._percentile(latencies, 0.50),
+            latency_p99=self._percentile(latencies, 0.99),
+            eta=eta,
+        )
+
+    def report(self, running: int, waiting: int, force: bool = False) -> None:
+        """Reports the statistics if the reporting interval has elapsed or if forced."""
+        if not force and time.monotonic() < self.next_report_time:
+            return
+        stats = self.snapshot(running, waiting)
+        if self._progress_callback:
+            self._progress_callback(stats)
+        if self._stats_file:
+            # Write atomically, so that the file can be read at any time
+            temp_file = f"{self._stats_file}.tmp"
+            with open(temp_file, "w") as f:
+                json.dump(stats._asdict(), f, indent=4)
+            os.replace(temp_file, self._stats_file)
+        self.next_report_time = time.monotonic() + self._stats_interval
+
+    @staticmethod
+    def _percentile(sorted_ns: list[int], fraction: float) -> float | None:
+        """Returns the percentile of sorted durations in seconds, or None if empty."""
+        if not sorted_ns:
+            return None
+        return sorted_ns[int(fraction * (len(sorted_ns) - 1))] / NS_PER_SECOND
+
+
+# ---------------------------------------------------------------------------
+# CPU TOPOLOGY
+# ---------------------------------------------------------------------------
+def available_cpus() -> list[int]:
+    """
+    Returns a sorted list of CPU ids the current process is allowed to run on.
+
+    Unlike os.cpu_count(), this respects CPU affinity masks and container CPU sets
+    where the operating system supports it (Linux). Elsewhere, all CPUs are assumed
+    to be available.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _parse_cpu_list(cpu_list: str) -> list[int]:
+    """Parses a Linux CPU list string, e.g. "0-3,8,10-11", into a list of CPU ids."""
+    cpus = []
+    for part in cpu_list.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def numa_nodes() -> list[list[int]]:
+    """
+    Returns a list of NUMA nodes, each being a sorted list of available CPU ids
+    belonging to that node. Only CPUs in the current process' affinity mask are listed.
+
+    If the NUMA topology cannot be read, all available CPUs are returned as a single node.
+    """
+    cpus = available_cpus()
+    allowed = set(cpus)
+    nodes = []
+    node_dirs = glob(os.path.join(NUMA_NODES_DIR, "node[0-9]*"))
+    for node_dir in sorted(node_dirs, key=lambda d: int(d.rsplit("node", 1)[1])):
+        try:
+            with open(os.path.join(node_dir, "cpulist")) as f:
+                node_cpus = [c for c in _parse_cpu_list(f.read()) if c in allowed]
+        except (OSError, ValueError):
+            return [cpus]
+        if node_cpus:
+            nodes.append(node_cpus)
+    return nodes or [cpus]
+
+
+def _assign_worker_cpus(n_workers: int, numa_aware: bool) -> list[int]:
+    """
+    Returns a list of CPU ids, one for each worker. The CPUs are distinct unless
+    there are more workers than CPUs, in which case they are handed out round-robin.
+
+    When numa_aware=True, CPUs are handed out node by node, so that a pool smaller
+    than the machine occupies as few NUMA nodes as possible.
+    """
+    if numa_aware:
+        cpus = [cpu for node in numa_nodes() for cpu in node]
+    else:
+        cpus = available_cpus()
+    return list(islice(cycle(cpus), n_workers))
+
+
+# ---------------------------------------------------------------------------
+# WORKER INITIALISATION
+# ---------------------------------------------------------------------------
+@contextmanager
+def limit_threads(n_threads: int | None) -> Iterator[None]:
+    """
+    Temporarily caps the number of threads native numerical libraries are allowed to
+    spawn by setting THREAD_LIMIT_ENV_VARS. Child processes started inside the "with"
+    block inherit the limit. Does nothing if n_threads is None.
+    """
+    if n_threads is None:
+        yield
+        return
+    saved = {var: os.environ.get(var) for var in THREAD_LIMIT_ENV_VARS}
+    os.environ.update({var: str(n_threads) for var in THREAD_LIMIT_ENV_VARS})
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def _pin_worker(cpu_queue: mp.Queue) -> None:
+    """Worker process initialiser which pins the process to a CPU taken from the queue."""
+    os.sched_setaffinity(0, {cpu_queue.get()})
 
 
 # ---------------------------------------------------------------------------
 # FUNCTIONS
 # ---------------------------------------------------------------------------
+def _new_process_pool(
+    max_workers: int, pin_cpus: bool, numa_aware: bool
+) -> concurrent.futures.ProcessPoolExecutor:
+    """Creates a new process pool, optionally pinning each worker to a distinct CPU."""
+    initializer, initargs = None, ()
+    if pin_cpus and hasattr(os, "sched_setaffinity"):
+        cpu_queue = mp.Queue()
+        for cpu in _assign_worker_cpus(max_workers, numa_aware):
+            cpu_queue.put(cpu)
+        initializer, initargs = _pin_worker, (cpu_queue,)
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers, initializer=initializer, initargs=initargs
+    )
+
+
+def _new_executor(
+    backend: str, max_workers: int, pin_cpus: bool, numa_aware: bool
+) -> concurrent.futures.Executor:
+    """Creates a new executor for the "process" or "thread" backend."""
+    if backend == "thread":
+        return concurrent.futures.ThreadPoolExecutor(max_workers)
+    return _new_process_pool(max_workers, pin_cpus, numa_aware)
+
+
+def _terminate_executor(executor: concurrent.futures.Executor) -> None:
+    """
+    Kills all worker processes, including the ones stuck on a task, and shuts down the pool.
+
+    Threads cannot be killed, so a thread pool is shut down without waiting for running
+    tasks, which keep running in the background until they finish.
+    """
+    if isinstance(executor, concurrent.futures.ThreadPoolExecutor):
+        executor.shutdown(wait=False, cancel_futures=True)
+        return
+    if hasattr(executor, "terminate_workers"):  # Python 3.14+
+        executor.terminate_workers()
+        return
+    # Fall back to private API on older versions
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _is_broken(future: concurrent.futures.Future) -> bool:
+    """Returns True if the future failed because its worker process died."""
+    return (
+        future.done()
+        and not future.cancelled()
+        and isinstance(future.exception(), BrokenProcessPool)
+    )
+
+
+def _has_outcome(future: concurrent.futures.Future) -> bool:
+    """Returns True if the worker has returned a result or raised an exception."""
+    return future.done() and not (future.cancelled() or _is_broken(future))
+
+
+def _failed_future(error: BaseException) -> concurrent.futures.Future:
+    """Returns a completed Future object holding the provided exception."""
+    future = concurrent.futures.Future()
+    future.set_exception(error)
+    return future
+
+
+def _completed_future(result: Any) -> concurrent.futures.Future:
+    """Returns a completed Future object holding the provided result."""
+    future = concurrent.futures.Future()
+    future.set_result(result)
+    return future
+
+
+async def _do_async_work(
+    worker: Callable,
+    tasks: Iterator[_Task],
+    max_workers: int,
+    worker_done_callback: Callable[[concurrent.futures.Future], Any],
+    timeout: float | None,
+    retries: int,
+    retry_backoff: float,
+    tracker: _ProgressTracker | None,
+    checkpoint: _Checkpoint | None,
+) -> list[FailedTask]:
+    """Runs the coroutine worker on all tasks, running at most max_workers at once."""
+    failed_tasks = []
+    running = waiting = 0
+
+    async def consume(worker_number: int) -> None:
+        """Runs tasks one after another until there are none left."""
+        nonlocal running, waiting
+        for task in tasks:  # The iterator is shared between all consumers
+            attempt = 1
+            while True:
+                future = concurrent.futures.Future()
+                running += 1
+                try:
+                    with CodeTimer(no_print=True) as timer:
+                        coroutine = worker(*task.args, **task.kwargs)
+                        result = await asyncio.wait_for(coroutine, timeout)
+                    future.set_result(result)
+                    if tracker:
+                        tracker.record_run(worker_number, timer.ns)
+                    if checkpoint is not None:
+                        checkpoint.record(task.index, result)
+                except Exception as error:
+                    if isinstance(error, asyncio.TimeoutError):  # Differs before 3.11
+                        error = TimeoutError(
+                            f"Task exceeded the timeout of {timeout} s."
+                        )
+                    if attempt <= retries:
+                        running -= 1
+                        waiting += 1
+                        await asyncio.sleep(retry_backoff * 2 ** (attempt - 1))
+                        waiting -= 1
+                        attempt += 1
+                        continue
+                    failed_tasks.append(
+                        FailedTask(task.args, task.kwargs, error, attempt)
+                    )
+                    future.set_exception(error)
+                running -= 1
+                break
+            if tracker:
+                tracker.record_done(future.exception() is not None)
+            if worker_done_callback:
+                worker_done_callback(future)
+
+    async def report() -> None:
+        """Reports progress periodically until cancelled."""
+        while True:
+            await asyncio.sleep(max(tracker.next_report_time - time.monotonic(), 0))
+            tracker.report(running, waiting)
+
+    consumers = [asyncio.ensure_future(consume(n)) for n in range(max_workers)]
+    reporter = asyncio.ensure_future(report()) if tracker else None
+    try:
+        await asyncio.gather(*consumers)
+    except BaseException:
+        for consumer in consumers:
+            consumer.cancel()
+        raise
+    finally:
+        if reporter:
+            reporter.cancel()
+    if tracker:
+        tracker.report(0, 0, force=True)
+    return failed_tasks
+
+
 def do_multicore_work(
     worker: Callable,
     args: Iterable[tuple] = None,
     kwargs: Iterable[dict] = None,
     worker_done_callback: Callable[[concurrent.futures.Future], Any] = None,
     idle_cpus: int = 0,
-):
+    pin_cpus: bool = False,
+    numa_aware: bool = False,
+    worker_threads: int | None = None,
+    timeout: float | None = None,
+    retries: int = 0,
+    retry_backoff: float = 0.0,
+    backend: str = "process",
+    max_workers: int | None = None,
+    progress_callback: Callable[[WorkStats], Any] = None,
+    stats_file: str = None,
+    stats_interval: float = 1.0,
+    total: int | None = None,
+    checkpoint_file: str = None,
+    checkpoint_results: bool = False,
+) -> list[FailedTask]:
     """
     Splits the work done by the worker function across multiple CPU cores in a way which
     does not leak memory and uses only the resources required for the active workers.
 
-    WARNING: This function must be run inside 'if __name__ == "__main__":' construct!
+    I/O-bound work can instead be spread across threads or asyncio tasks by choosing a
+    different backend, without changing the rest of the call.
+
+    WARNING: When using the "process" backend, this function must be run inside
+             'if __name__ == "__main__":' construct!
 
     Parameters:
         - worker: A function which does work.
@@ -26,16 +574,75 @@ def do_multicore_work(
         - kwargs: An iterable containing dictionaries of keyword arguments.
         - worker_done_callback: A function which is called with a Future object as the only
                                 parameter as soon as the worker completes assigned work.
+                                A task which is retried is reported only once, after its
+                                final attempt.
         - idle_cpus: How many CPU cores to leave unoccupied. At minimum 1 core will be used.
+                     The number of cores is the number of CPUs this process is allowed
+                     to run on, which respects affinity masks and container CPU limits.
+        - pin_cpus: If True, each worker process is pinned to a distinct CPU core.
+                    Ignored on platforms which do not support setting CPU affinity,
+                    and by backends other than "process".
+        - numa_aware: If True and pin_cpus=True, cores are assigned NUMA node by node,
+                      keeping the workers on as few nodes as possible.
+        - worker_threads: If provided, caps the number of threads spawned inside each
+                          worker by OpenMP/BLAS-backed libraries to prevent
+                          oversubscribing the CPU. Setting it to 1 is usually optimal.
+                          Ignored by backends other than "process".
+        - timeout: Maximum number of seconds a single task may run for. Workers stuck on
+                   a task are killed and the task fails with TimeoutError. Other tasks
+                   running at the time are resubmitted without counting as a failure.
+        - retries: How many times to retry a failed task before giving up on it.
+        - retry_backoff: Delay in seconds before the first retry, doubling on each
+                         subsequent retry of the same task.
+        - backend: How the work is executed:
+            - "process": In a pool of worker processes. Suitable for CPU-bound work.
+            - "thread": In a pool of threads. Suitable for I/O-bound work and workers
+                        which cannot be pickled, e.g. closures.
+            - "asyncio": As asyncio tasks in an event loop run by this function. The
+                         worker must be a coroutine function. Cannot be used from
+                         inside a running event loop.
+        - max_workers: How many tasks to run concurrently. Defaults to the number of
+                       available CPU cores minus idle_cpus, which is usually too low
+                       for I/O-bound work on "thread" and "asyncio" backends.
+        - progress_callback: A function which is periodically called with a WorkStats
+                             object holding live progress, throughput, utilization,
+                             latency and ETA statistics, and once more when done.
+        - stats_file: Path to a JSON file which is periodically overwritten with
+                      the same statistics.
+        - stats_interval: How often to report the statistics, in seconds.
+        - total: The total number of tasks, used for estimating the time remaining.
+                 Determined automatically if args or kwargs have a length.
+        - checkpoint_file: Path to an append-only journal of completed tasks. If the
+                           file exists, tasks recorded in it are skipped, so that
+                           interrupted work can be resumed by rerunning the call with
+                           the same args and kwargs, in the same order.
+        - checkpoint_results: If True, task results are pickled into the journal too,
+                              and skipped tasks are reported to worker_done_callback
+                              with their stored results. Otherwise, skipped tasks are
+                              not reported.
 
+    Returns:
+        - A list of FailedTask objects for tasks which failed on their final attempt.
 
-    NOTE:   This function assumes that the task the worker executes is CPU bound and that
-            the operating system will assign each worker to a different core, achieving
-            optimal resource usage. However, there is no guarantee this will happen as
-            CPU affinity is not explicitly set.
+    NOTE:   If a worker process dies (e.g. segfaults or is killed by the OOM killer), the
+            pool is respawned and the work continues. Tasks which were running at the
+            time are rerun one at a time to find the culprit, so only the task which
+            crashed the worker counts the crash as a failed attempt.
+
+    NOTE:   Threads cannot be killed. When a task times out on the "thread" backend,
+            it is reported as failed and left running in the background, while the
+            remaining tasks are run in a fresh thread pool.
+
+    NOTE:   Unless pin_cpus=True, this function assumes that the task the worker executes
+            is CPU bound and that the operating system will assign each worker to a
+            different core, achieving optimal resource usage.
     """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend must be one of {BACKENDS}, got {backend!r}.")
+    if backend == "asyncio" and not inspect.iscoroutinefunction(worker):
+        raise TypeError("The asyncio backend requires a coroutine function worker.")
     if not any((args, kwargs)):  # Both are None or empty iterables
-        return  # Workers cannot work without arguments
+        return []  # Workers cannot work without arguments
     elif all((args, kwargs)):  # Both are provided
         # Use zip to exit early if iterables do not have the same length
         # and one of them runs out before the other
@@ -43,10 +650,297 @@ def do_multicore_work(
     else:  # Either args or kwargs are provided, but not both
         workload = zip_longest(args or [], kwargs or [], fillvalue={} if args else ())
 
-    max_workers = max(mp.cpu_count() - idle_cpus, 1)
+    if max_workers is None:
+        max_workers = max(len(available_cpus()) - idle_cpus, 1)
+    tasks = (_Task(i, a, ka) for i, (a, ka) in enumerate(workload))
+    checkpoint = None
+    if checkpoint_file:
+        checkpoint = _Checkpoint(checkpoint_file, checkpoint_results)
+        tasks = checkpoint.skip_completed(tasks, worker_done_callback)
+    tracker = None
+    if progress_callback or stats_file:
+        if total is None:
+            lengths = [len(x) for x in (args, kwargs) if hasattr(x, "__len__")]
+            total = min(lengths) if lengths else None
+        if total is not None and checkpoint is not None:
+            total = max(total - len(checkpoint), 0)  # Only count the remaining tasks
+        tracker = _ProgressTracker(
+            total, max_workers, progress_callback, stats_file, stats_interval
+        )
+    if backend == "asyncio":
+        return asyncio.run(
+            _do_async_work(
+                worker,
+                tasks,
+                max_workers,
+                worker_done_callback,
+                timeout,
+                retries,
+                retry_backoff,
+                tracker,
+                checkpoint,
+            )
+        )
 
-    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
-        futures = (executor.submit(worker, *a, **ka) for a, ka in workload)
-        for future in concurrent.futures.as_completed(futures):
-            if worker_done_callback:
-                worker_done_callback(future)
+    retry_queue = []  # Heap of (ready time, task index, task)
+    suspects = deque()  # Tasks running when a worker crashed, rerun one at a time
+    pending = {}  # Future -> (task, submission time)
+    failed_tasks = []
+
+    def complete(task: _Task, future: concurrent.futures.Future) -> None:
+        """Reports the task result or schedules a retry if the task failed."""
+        if (error := future.exception()) is not None:
+            if task.attempt <= retries:
+                ready_time = time.monotonic() + retry_backoff * 2 ** (task.attempt - 1)
+                retry = task._replace(attempt=task.attempt + 1)
+                heapq.heappush(retry_queue, (ready_time, task.index, retry))
+                return
+            failed_tasks.append(FailedTask(task.args, task.kwargs, error, task.attempt))
+        elif tracker:
+            timed_result = future.result()
+            tracker.record_run(timed_result.worker_key, timed_result.time_ns)
+            future = _completed_future(timed_result.value)
+        if checkpoint is not None and error is None:
+            checkpoint.record(task.index, future.result())
+        if tracker:
+            tracker.record_done(error is not None)
+        if worker_done_callback:
+            worker_done_callback(future)
+
+    def next_task() -> _Task | None:
+        """Returns the next task to submit, or None if none is ready to be submitted."""
+        if suspects:  # Isolate suspects to find out which one crashes the worker
+            return None if pending else suspects.popleft()
+        if retry_queue and retry_queue[0][0] <= time.monotonic():
+            return heapq.heappop(retry_queue)[2]
+        return next(tasks, None)
+
+    submitted_worker = _TimedWorker(worker) if tracker else worker
+    with limit_threads(worker_threads):
+        new_executor = partial(
+            _new_executor, backend, max_workers, pin_cpus, numa_aware
+        )
+        executor = new_executor()
+        try:
+            while True:
+                # Submit new work only when a worker is available to pick it up
+                while len(pending) < max_workers and (task := next_task()):
+                    future = executor.submit(
+                        submitted_worker, *task.args, **task.kwargs
+                    )
+                    pending[future] = (task, time.monotonic())
+                if tracker:
+                    tracker.report(len(pending), len(retry_queue) + len(suspects))
+                if not pending:
+                    if not retry_queue:
+                        break  # All work is done
+                    wake_time = retry_queue[0][0]
+                    if tracker:
+                        wake_time = min(wake_time, tracker.next_report_time)
+                    time.sleep(max(wake_time - time.monotonic(), 0))
+                    continue
+
+                # Wake up on the first completion, timeout, retry or report becoming due
+                deadlines = [tracker.next_report_time] if tracker else []
+                if timeout is not None:
+                    deadlines.extend(start + timeout for _, start in pending.values())
+                if retry_queue:
+                    deadlines.append(retry_queue[0][0])
+                wait_time = (
+                    max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+                )
+                done, _ = concurrent.futures.wait(
+                    pending, wait_time, concurrent.futures.FIRST_COMPLETED
+                )
+
+                if any(_is_broken(future) for future in done):
+                    executor.shutdown(wait=True)  # Resolves all pending futures
+                    executor = new_executor()
+                    # A task which crashed the worker on its own is the culprit
+                    culprit_known = len(pending) == 1
+                    for future, (task, _) in pending.items():
+                        if _has_outcome(future) or culprit_known:
+                            complete(task, future)
+                        else:
+                            suspects.append(task)
+                    pending.clear()
+                    continue
+                for future in done:
+                    complete(pending.pop(future)[0], future)
+
+                if timeout is None:
+                    continue
+                now = time.monotonic()
+                expired = {f for f, (_, t) in pending.items() if now - t >= timeout}
+                if not expired:
+                    continue
+                error = TimeoutError(f"Task exceeded the timeout of {timeout} s.")
+                if backend == "thread":
+                    # Leave hung threads behind and carry on in a fresh pool
+                    executor.shutdown(wait=False)
+                    executor = new_executor()
+                    for future in expired:
+                        complete(pending.pop(future)[0], _failed_future(error))
+                    continue
+                _terminate_executor(executor)
+                executor = new_executor()
+                for future, (task, _) in pending.items():
+                    if future in expired:
+                        complete(task, _failed_future(error))
+                    elif _has_outcome(future):
+                        # Finished before the pool was terminated
+                        complete(task, future)
+                    else:
+                        # Innocent bystander, resubmit without counting an attempt
+                        heapq.heappush(retry_queue, (now, task.index, task))
+                pending.clear()
+        except BaseException:
+            # Do not wait for workers which may be stuck on a task
+            _terminate_executor(executor)
+            raise
+        executor.shutdown(wait=True)
+    if tracker:
+        tracker.report(0, 0, force=True)
+    return failed_tasks
+
+
+def pmap_chunks(
+    worker: Callable[[list], Any],
+    iterable: Iterable,
+    chunk_size: int,
+    prefetch: int = 2,
+    **kwargs,
+) -> list:
+    """
+    Splits the iterable into chunks and processes each chunk with the worker using
+    do_multicore_work, returning the results in the order of the chunks.
+
+    The chunks are read ahead in a background thread (see prefetch_chunks), so that
+    reading a slow iterable overlaps with the workers processing earlier chunks.
+
+    WARNING: When using the "process" backend, this function must be run inside
+             'if __name__ == "__main__":' construct!
+
+    Parameters:
+        - worker: A function accepting a list of items and returning a result. Must be
+                  a coroutine function when using the "asyncio" backend.
+        - iterable: The items to process.
+        - chunk_size: Maximum number of items in each chunk.
+        - prefetch: Maximum number of chunks read ahead of the workers.
+        - kwargs: Passed to do_multicore_work, e.g. backend, max_workers, timeout.
+                  Chunks are submitted as workers become available, so at most
+                  prefetch + max_workers chunks are held in memory at once.
+                  If checkpoint_file is provided, processed chunks are recorded
+                  with their results, so that rerunning an interrupted call skips
+                  them and restores their results.
+
+    Raises the error of the first chunk, in order, which could not be processed.
+    """
+    results = {}
+
+    def store_result(future: concurrent.futures.Future) -> None:
+        """Stores the result of a successfully processed chunk by its index."""
+        if future.exception() is None:
+            index, result = future.result()
+            results[index] = result
+
+    if inspect.iscoroutinefunction(worker):
+
+        async def indexed_worker(index: int, chunk: list) -> tuple[int, Any]:
+            return index, await worker(chunk)
+
+    else:
+        indexed_worker = _IndexedWorker(worker)
+    if kwargs.get("checkpoint_file"):
+        kwargs["checkpoint_results"] = True
+    chunks = enumerate(prefetch_chunks(iterable, chunk_size, prefetch))
+    failed_tasks = do_multicore_work(
+        indexed_worker, args=chunks, worker_done_callback=store_result, **kwargs
+    )
+    if failed_tasks:
+        raise min(failed_tasks, key=lambda task: task.args[0]).error
+    return [results[index] for index in range(len(results))]
+
+
+def sweep(
+    function: Callable,
+    permutations: Permutations,
+    output_file: str = None,
+    stop_condition: Callable[[list[dict]], bool] = None,
+    **kwargs,
+) -> list[dict]:
+    """
+    Runs the function with each combination of parameters as keyword arguments using
+    do_multicore_work, timing each run, and returns a table of the results.
+
+    WARNING: When using the "process" backend, this function must be run inside
+             'if __name__ == "__main__":' construct!
+
+    Parameters:
+        - function: A function accepting the parameters as keyword arguments. Must be
+                    a coroutine function when using the "asyncio" backend.
+        - permutations: Combinations of parameters to run the function with. Slices of
+                        a large grid can be swept on different machines.
+        - output_file: Path to a file each row is written to as soon as its run is
+                       done: a CSV file if the path ends with ".csv", otherwise a file
+                       of pickled rows which can be read with iter_unpickle.
+        - stop_condition: A function which is called with the list of rows after each
+                          run. Once it returns True, no more runs are started, while
+                          the runs in progress are completed.
+        - kwargs: Passed to do_multicore_work, e.g. backend, max_workers, timeout.
+                  If checkpoint_file is provided, completed runs are recorded with
+                  their results, so that rerunning an interrupted sweep skips them
+                  and restores their rows.
+
+    Returns:
+        - A list of rows sorted by combination, one for each run. Each row is a dict
+          holding the index of the combination, the parameters, the result, runtime
+          in seconds and the error raised (None for successful runs). Failed runs have
+          no result or runtime.
+    """
+    rows = []
+    stopped = False
+    output = _SweepOutput(output_file) if output_file else None
+
+    def add_row(index: int, result: Any, runtime: float | None, error=None) -> None:
+        """Adds the row of a run and checks whether to stop the sweep."""
+        nonlocal stopped
+        row = {"index": index, **permutations[index]}
+        row.update(result=result, runtime=runtime, error=error)
+        rows.append(row)
+        if output is not None:
+            output.write(row)
+        if stop_condition is not None and stop_condition(rows):
+            stopped = True
+
+    def store_result(future: concurrent.futures.Future) -> None:
+        """Adds the row of a successful run."""
+        if future.exception() is None:
+            add_row(*future.result())
+
+    if inspect.iscoroutinefunction(function):
+
+        async def timed_function(index: int, params: dict) -> tuple[int, Any, float]:
+            with CodeTimer(no_print=True) as timer:
+                result = await function(**params)
+            return index, result, timer.s
+
+    else:
+        timed_function = _SweepWorker(function)
+    kwargs.setdefault("total", len(permutations))
+    if kwargs.get("checkpoint_file"):
+        kwargs["checkpoint_results"] = True
+    try:
+        failed_tasks = do_multicore_work(
+            timed_function,
+            args=takewhile(lambda _: not stopped, enumerate(permutations)),
+            worker_done_callback=store_result,
+            **kwargs,
+        )
+        for task in failed_tasks:
+            add_row(task.args[0], None, None, task.error)
+    finally:
+        if output is not None:
+            output.close()
+    rows.sort(key=lambda row: row["index"])
+    return rows
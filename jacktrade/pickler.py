@@ -1,21 +1,509 @@
+import bz2
+import gzip
+import hashlib
+import inspect
+import lzma
+import marshal
+import mmap
+import os
 import pickle
-from typing import Any
+import struct
+import time
+import uuid
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from contextlib import suppress
+from functools import partial, wraps
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Mapping
+
+# ---------------------------------------------------------------------------
+# CONSTANTS
+# ---------------------------------------------------------------------------
+DEFAULT_PROTOCOL = 5  # Supports out-of-band data and is faster for large objects
+# Functions opening a file object for (de)compression, by compression name
+COMPRESSORS: dict[str, Callable[..., BinaryIO]] = {
+    "gzip": gzip.open,
+    "bz2": bz2.open,
+    "lzma": lzma.open,
+}
+# Leading bytes identifying a compressed file, by compression name
+MAGIC_NUMBERS = {
+    "gzip": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "lzma": b"\xfd7zXZ\x00",
+}
+# Out-of-band container format:
+#   [header][segment table][pickle stream][aligned buffer][aligned buffer]...
+OUT_OF_BAND_MAGIC = b"JTPKOOB1"
+OUT_OF_BAND_MIN_SIZE = 65536  # Smaller buffers are kept inside the pickle stream
+BUFFER_ALIGNMENT = 64  # Bytes, suits SIMD instructions and cache lines
+_HEADER = struct.Struct("<8sQQ")  # Magic, pickle stream size, number of buffers
+_SEGMENT = struct.Struct("<QQ")  # Buffer offset, buffer size
+CACHE_FILE_SUFFIX = ".pickle"
+LOCK_FILE_SUFFIX = ".lock"
+# Executors running bulk pickling and unpickling, by backend name
+EXECUTORS: dict[str, type[Executor]] = {
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
+
+
+# ---------------------------------------------------------------------------
+# CLASSES
+# ---------------------------------------------------------------------------
+class _FileLock:
+    """
+    An inter-process lock backed by a lock file, used inside a "with" statement.
+
+    A lock file older than stale_after seconds is assumed to be left behind by
+    a crashed process and is broken. Breaking is atomic, so that of several processes
+    finding the same stale lock only one removes it.
+    """
+
+    _POLL_INTERVAL = 0.05  # Seconds
+
+    def __init__(self, path: str | Path, stale_after: float) -> None:
+        self._path = path
+        self._stale_after = stale_after
+
+    def __enter__(self):
+        while True:
+            try:
+                os.close(os.open(self._path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                with suppress(FileNotFoundError):  # Released in the meantime
+                    stat = os.stat(self._path)
+                    if time.time() - stat.st_mtime > self._stale_after:
+                        if self._break(stat):
+                            continue
+                time.sleep(self._POLL_INTERVAL)
+
+    def _break(self, stale: os.stat_result) -> bool:
+        """
+        Removes the lock file if it is still the stale one, returning True if it was.
+
+        The lock file is first renamed to a unique name, which succeeds for only one
+        of the processes breaking the same lock. A process losing the race may rename
+        the fresh lock of the winner instead, which it puts back in place.
+        """
+        moved = f"{self._path}.{uuid.uuid4().hex}"
+        os.rename(self._path, moved)
+        if os.path.samestat(os.stat(moved), stale):
+            os.remove(moved)
+            return True
+        with suppress(FileExistsError):  # Acquired by yet another process
+            os.link(moved, self._path)
+        os.remove(moved)
+        return False
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        with suppress(FileNotFoundError):
+            os.remove(self._path)
 
 
 # ---------------------------------------------------------------------------
 # FUNCTIONS
 # ---------------------------------------------------------------------------
-def pickle_object(obj: Any, filename: str, protocol=None) -> None:
+def _detect_compression(file: BinaryIO) -> str | None:
+    """
+    Returns the name of the compression the file was written with, or None if the
+    file is not compressed. The file position is left unchanged.
+    """
+    position = file.tell()
+    header = file.read(max(len(magic) for magic in MAGIC_NUMBERS.values()))
+    file.seek(position)
+    for compression, magic in MAGIC_NUMBERS.items():
+        if header.startswith(magic):
+            return compression
+    return None
+
+
+def _align(offset: int) -> int:
+    """Rounds the offset up to the nearest multiple of BUFFER_ALIGNMENT."""
+    return -(-offset // BUFFER_ALIGNMENT) * BUFFER_ALIGNMENT
+
+
+def _dump_out_of_band(obj: Any, file: BinaryIO, protocol: int) -> None:
+    """
+    Pickles the object into the out-of-band container format, where large buffers
+    are written as separate aligned segments rather than into the pickle stream.
+    """
+    buffers = []
+
+    def buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+        """Collects large buffers. Returns True to pickle a buffer in-band."""
+        view = buffer.raw()
+        if view.nbytes < OUT_OF_BAND_MIN_SIZE:
+            return True
+        buffers.append(view)
+        return False
+
+    data = pickle.dumps(obj, protocol=protocol, buffer_callback=buffer_callback)
+    offset = _HEADER.size + _SEGMENT.size * len(buffers) + len(data)
+    segments = []
+    for view in buffers:
+        offset = _align(offset)
+        segments.append((offset, view.nbytes))
+        offset += view.nbytes
+
+    file.write(_HEADER.pack(OUT_OF_BAND_MAGIC, len(data), len(buffers)))
+    for segment in segments:
+        file.write(_SEGMENT.pack(*segment))
+    file.write(data)
+    for (offset, _), view in zip(segments, buffers):
+        file.write(b"\0" * (offset - file.tell()))
+        file.write(view)
+
+
+def _load_out_of_band(file: BinaryIO, mmap_buffers: bool) -> Any:
+    """
+    Unpickles the object from the out-of-band container format. If mmap_buffers=True,
+    buffers are memory-mapped from the file instead of being read into memory.
+    """
+    _, data_size, n_buffers = _HEADER.unpack(file.read(_HEADER.size))
+    segments = [_SEGMENT.unpack(file.read(_SEGMENT.size)) for _ in range(n_buffers)]
+    data = file.read(data_size)
+    if mmap_buffers and segments:
+        # Copy-on-write mapping: pages are shared until written to
+        mapping = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY))
+        buffers = [mapping[offset : offset + size] for offset, size in segments]
+    else:
+        buffers = []
+        for offset, size in segments:
+            file.seek(offset)
+            file.readinto(buffer := bytearray(size))
+            buffers.append(buffer)
+    return pickle.loads(data, buffers=buffers)
+
+
+def pickle_object(
+    obj: Any,
+    filename: str,
+    protocol: int = DEFAULT_PROTOCOL,
+    compression: str | None = None,
+    out_of_band: bool = False,
+) -> None:
     """
     Pickles the provided Python object and outputs it to the target file.
+
+    The object is written to a temporary file first, which then replaces the target
+    file, so that the target file is never left partially written.
+
+    Parameters:
+        - obj: The object to pickle.
+        - filename: Path to the output file.
+        - protocol: Pickle protocol to use. None or a negative number selects
+                    pickle.HIGHEST_PROTOCOL.
+        - compression: One of COMPRESSORS keys ("gzip", "bz2" or "lzma") to compress
+                       the pickle stream as it is written, or None to not compress it.
+        - out_of_band: If True, large buffers (e.g. NumPy arrays, bytearrays) are
+                       written outside the pickle stream as aligned segments, without
+                       being copied. They can then be memory-mapped when unpickling.
+                       Requires protocol 5 or higher and no compression.
     """
-    with open(filename, "wb") as f:
-        pickle.dump(obj, f, protocol=protocol)
+    if compression is not None and compression not in COMPRESSORS:
+        raise ValueError(
+            f"Compression must be one of {tuple(COMPRESSORS)}, got {compression!r}."
+        )
+    if protocol is None or protocol < 0:
+        protocol = pickle.HIGHEST_PROTOCOL
+    if out_of_band and (compression is not None or protocol < 5):
+        raise ValueError("Out-of-band pickling requires protocol 5 and no compression.")
+    # Unlike tempfile.mkstemp, open() creates the file with default permissions
+    temp_filename = f"{filename}.{uuid.uuid4().hex}.tmp"
+    temp_file = open(temp_filename, "xb")
+    try:
+        with temp_file as f:
+            if out_of_band:
+                _dump_out_of_band(obj, f, protocol)
+            elif compression is None:
+                pickle.dump(obj, f, protocol=protocol)
+            else:
+                with COMPRESSORS[compression](f, "wb") as cf:
+                    pickle.dump(obj, cf, protocol=protocol)
+            f.flush()
+            os.fsync(f.fileno())  # Data must be on disk before it replaces the target
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.remove(temp_filename)
+        raise
 
 
-def unpickle_object(filename: str) -> Any:
+def unpickle_object(filename: str, mmap_buffers: bool = False) -> Any:
     """
     Unpickles the Python object from a target file and returns it.
+    Compressed and out-of-band files are detected and loaded automatically.
+
+    If mmap_buffers=True, out-of-band buffers are memory-mapped from the file instead
+    of being read into memory. Objects which support zero-copy unpickling, such as
+    NumPy arrays, are then backed by the mapping, so loading is near-instant and the
+    memory pages are shared between processes until they are written to.
+    """
+    with open(filename, "rb") as f:
+        if f.read(len(OUT_OF_BAND_MAGIC)) == OUT_OF_BAND_MAGIC:
+            f.seek(0)
+            return _load_out_of_band(f, mmap_buffers)
+        f.seek(0)
+        if (compression := _detect_compression(f)) is None:
+            return pickle.load(f)
+        with COMPRESSORS[compression](f, "rb") as cf:
+            return pickle.load(cf)
+
+
+def append_pickle(obj: Any, filename: str, protocol: int = DEFAULT_PROTOCOL) -> None:
+    """
+    Pickles the provided Python object and appends it to the end of the target file,
+    which may hold any number of previously pickled objects.
+    """
+    with open(filename, "ab") as f:
+        pickle.dump(obj, f, protocol=protocol)
+
+
+def iter_unpickle(filename: str, repair: bool = False) -> Iterator[Any]:
+    """
+    Yields all objects pickled one after another into the target file, in order.
+
+    A truncated object at the end of the file, usually left behind by a crash
+    mid-write, is ignored. If repair=True, it is also removed from the file so that
+    new objects can be appended after the last intact one.
     """
     with open(filename, "rb") as f:
-        return pickle.load(f)
+        while True:
+            end_of_last_object = f.tell()
+            try:
+                obj = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                break
+            yield obj
+    if repair:
+        with open(filename, "r+b") as f:
+            f.truncate(end_of_last_object)
+
+
+def _executor_class(backend: str) -> type[Executor]:
+    """Returns the executor class for bulk pickling and unpickling."""
+    if backend not in EXECUTORS:
+        raise ValueError(f"Backend must be one of {tuple(EXECUTORS)}, got {backend!r}.")
+    return EXECUTORS[backend]
+
+
+def pickle_objects(
+    objects: Mapping[str, Any],
+    protocol: int = DEFAULT_PROTOCOL,
+    compression: str | None = None,
+    out_of_band: bool = False,
+    backend: str = "thread",
+    max_workers: int | None = None,
+) -> None:
+    """
+    Pickles many Python objects in parallel, each to its own file.
+    Every file is written atomically, as with pickle_object.
+
+    Parameters:
+        - objects: Mapping of target file names to objects to pickle into them.
+        - protocol, compression, out_of_band: Same as for pickle_object.
+        - backend: "thread" or "process". Threads suit most uses, since writing
+                   and compressing release the GIL. Processes also pickle in
+                   parallel, but every object must first be sent to a worker.
+        - max_workers: Maximum number of files written at the same time,
+                       defaults to the executor's default.
+    """
+    with _executor_class(backend)(max_workers) as executor:
+        futures = [
+            executor.submit(
+                pickle_object, obj, filename, protocol, compression, out_of_band
+            )
+            for filename, obj in objects.items()
+        ]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+
+
+def _iter_unpickle_objects(
+    filenames: Iterable[str], mmap_buffers: bool, executor: Executor
+) -> Iterator[tuple[str, Any]]:
+    """
+    Yields (filename, object) pairs in order of completion. The executor is shut
+    down once done, cancelling the remaining files if the iteration stops early.
+    """
+    with executor:
+        load = partial(unpickle_object, mmap_buffers=mmap_buffers)
+        futures = {executor.submit(load, filename): filename for filename in filenames}
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def unpickle_objects(
+    filenames: Iterable[str],
+    stream: bool = False,
+    mmap_buffers: bool = False,
+    backend: str = "thread",
+    max_workers: int | None = None,
+) -> dict[str, Any] | Iterator[tuple[str, Any]]:
+    """
+    Unpickles Python objects from many files in parallel.
+
+    Parameters:
+        - filenames: Files to unpickle, each holding one object.
+        - stream: If False, waits for all files and returns a dict of objects keyed
+                  by file name, in the order of filenames. If True, returns an
+                  iterator of (filename, object) pairs in order of completion, so
+                  objects can be used while the rest are still loading.
+        - mmap_buffers: Same as for unpickle_object. Only useful with the "thread"
+                        backend, since objects loaded by worker processes are copied
+                        into the calling process.
+        - backend: "thread" or "process". Threads suit I/O-bound loading and
+                   decompression, which release the GIL. Processes also unpickle in
+                   parallel, but every object is pickled again to be returned, so
+                   they pay off only for heavily compressed files.
+        - max_workers: Maximum number of files loaded at the same time,
+                       defaults to the executor's default.
+    """
+    executor_class = _executor_class(backend)
+    if stream:
+        return _iter_unpickle_objects(
+            filenames, mmap_buffers, executor_class(max_workers)
+        )
+    filenames = list(filenames)
+    objects = dict(
+        _iter_unpickle_objects(filenames, mmap_buffers, executor_class(max_workers))
+    )
+    return {filename: objects[filename] for filename in filenames}
+
+
+# ---------------------------------------------------------------------------
+# DECORATORS
+# ---------------------------------------------------------------------------
+def _function_fingerprint(function: Callable) -> bytes:
+    """
+    Returns bytes identifying the function's qualified name and implementation,
+    so that changing the function's code invalidates its cached results.
+    """
+    try:
+        source = inspect.getsource(function).encode()
+    except (OSError, TypeError):  # Source unavailable, e.g. in the interpreter
+        source = marshal.dumps(function.__code__)
+    return f"{function.__module__}.{function.__qualname__}".encode() + source
+
+
+def _evict(cache_dir: Path, max_size: int | None, max_age: float | None) -> None:
+    """
+    Deletes cache files older than max_age seconds, then deletes the least recently
+    used cache files until the total size of the cache is within max_size bytes.
+    """
+    entries = []
+    now = time.time()
+    for path in cache_dir.glob(f"*{CACHE_FILE_SUFFIX}"):
+        with suppress(FileNotFoundError):  # Evicted by another process
+            stat = path.stat()
+            if max_age is not None and now - stat.st_mtime > max_age:
+                path.unlink()
+            else:
+                entries.append((stat.st_atime, stat.st_size, path))
+    if max_size is None:
+        return
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):  # Least recently used first
+        if total_size <= max_size:
+            break
+        with suppress(FileNotFoundError):
+            path.unlink()
+        total_size -= size
+
+
+def disk_cache(
+    cache_dir: str = ".cache",
+    max_size: int | None = None,
+    max_age: float | None = None,
+    compression: str | None = None,
+    lock_timeout: float = 3600,
+) -> Callable[[Callable], Callable]:
+    """
+    Decorator which memoizes the results of a pure function on disk, so that they
+    persist across runs and are shared between processes.
+
+    Each result is stored in a file named after the hash of the function's qualified
+    name, source code and arguments, which must be picklable. Changing the function's
+    code therefore invalidates its cached results.
+
+    Concurrent calls with the same arguments from multiple processes compute the
+    result only once, as the others wait on a lock file and then read the result.
+
+    Parameters:
+        - cache_dir: Directory holding the cached results.
+        - max_size: Maximum total size of the cache directory in bytes. When exceeded,
+                    least recently used results are evicted.
+        - max_age: Maximum age of a cached result in seconds, after which it is
+                   recomputed.
+        - compression: Compression used for pickling results, see pickle_object.
+        - lock_timeout: Seconds after which a lock is considered abandoned by a
+                        crashed process and is broken.
+
+    The wrapped function has the following additional attributes:
+        - hits: Number of calls served from the cache by this process.
+        - misses: Number of calls computed by this process.
+        - cache_clear(): Deletes all cached results from the cache directory.
+    """
+    directory = Path(cache_dir)
+
+    def decorator(function: Callable) -> Callable:
+        fingerprint = _function_fingerprint(function)
+
+        def load(path: Path) -> tuple[bool, Any]:
+            """Returns (True, result) if the result is cached, else (False, None)."""
+            try:
+                if max_age is not None and time.time() - path.stat().st_mtime > max_age:
+                    return False, None
+                result = unpickle_object(path)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                return False, None
+            with suppress(FileNotFoundError):  # Record access for LRU eviction
+                os.utime(path, (time.time(), path.stat().st_mtime))
+            return True, result
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            key_data = pickle.dumps(
+                (args, sorted(kwargs.items())), protocol=DEFAULT_PROTOCOL
+            )
+            key = hashlib.sha256(fingerprint + key_data).hexdigest()
+            path = directory / f"{key}{CACHE_FILE_SUFFIX}"
+            if (cached := load(path))[0]:
+                wrapper.hits += 1
+                return cached[1]
+            directory.mkdir(parents=True, exist_ok=True)
+            with _FileLock(directory / f"{key}{LOCK_FILE_SUFFIX}", lock_timeout):
+                # Another process may have computed the result while we waited
+                if (cached := load(path))[0]:
+                    wrapper.hits += 1
+                    return cached[1]
+                result = function(*args, **kwargs)
+                pickle_object(result, path, compression=compression)
+            wrapper.misses += 1
+            if max_size is not None or max_age is not None:
+                _evict(directory, max_size, max_age)
+            return result
+
+        def cache_clear() -> None:
+            """Deletes all cached results."""
+            _evict(directory, max_size=0, max_age=None)
+
+        wrapper.hits = 0
+        wrapper.misses = 0
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
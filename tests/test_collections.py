@@ -1,20 +1,44 @@
+import array
+import pickle
+import sys
+import threading
+import time
 import unittest
+from collections import Counter, OrderedDict, deque
 from dataclasses import dataclass
+from itertools import chain, islice
+from operator import attrgetter, itemgetter
 from typing import Iterator
+from unittest import mock
 
 from jacktrade import (
     BaseMapping,
+    BidirectionalMapping,
+    BoundedCache,
+    CacheStats,
+    CompactMapping,
+    LFUCache,
+    LRUCache,
     MasterDict,
     Permutations,
+    TTLCache,
     chunkify,
+    flatten,
     flatten_dict,
     flatten_list,
     get_first_dict_item,
     get_first_dict_key,
     get_first_dict_value,
     ichunkify,
+    iflatten,
+    iflatten_dict,
+    iflatten_list,
     limit_iterator,
+    memoize,
+    prefetch_chunks,
+    unflatten_dict,
 )
+from jacktrade.collections import _StringColumn
 
 # ---------------------------------------------------------------------------
 # TEST FIXTURES
@@ -49,6 +73,71 @@ PEOPLE = (
 CORRUPT_PEOPLE = (Person("Zargothrax", "666", None), None)
 
 
+class FakeArray:
+    """
+    Mimics the interface of a NumPy array of the given shape, holding the numbers
+    0, 1, 2, ... in C order. Records whether it was flattened by ravel().
+    """
+
+    def __init__(self, shape: tuple[int, ...], kind: str = "i", start: int = 0):
+        self.shape = shape
+        self.ndim = len(shape)
+        self.dtype = type("dtype", (), {"kind": kind})()
+        self.start = start
+        self.size = 1
+        for dim in shape:
+            self.size *= dim
+        self.ravelled = False
+
+    def ravel(self) -> list:
+        self.ravelled = True
+        return list(range(self.start, self.start + self.size))
+
+    def __iter__(self) -> Iterator:
+        if self.ndim == 1:
+            yield from range(self.start, self.start + self.size)
+            return
+        step = self.size // self.shape[0]
+        for i in range(self.shape[0]):
+            yield FakeArray(self.shape[1:], self.dtype.kind, self.start + i * step)
+
+
+class SliceableArray:
+    """Mimics a one-dimensional NumPy array, whose slices are views of the same data."""
+
+    ndim = 1
+
+    def __init__(self, data: list, start: int = 0, stop: int = None) -> None:
+        self.data = data
+        self.start = start
+        self.stop = len(data) if stop is None else stop
+
+    @property
+    def shape(self) -> tuple[int]:
+        return (len(self),)
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __iter__(self) -> Iterator:
+        return iter(self.data[self.start : self.stop])
+
+    def __getitem__(self, index: slice) -> "SliceableArray":
+        start, stop, _ = index.indices(len(self))
+        return SliceableArray(self.data, self.start + start, self.start + stop)
+
+    def __setitem__(self, index: slice, value) -> None:
+        for i in range(*index.indices(len(self))):
+            self.data[self.start + i] = value
+
+    def copy(self) -> "SliceableArray":
+        return SliceableArray(list(self))
+
+    def resize(self, shape: tuple[int], refcheck: bool = True) -> None:
+        self.data.extend([0] * (shape[0] - len(self.data)))
+        self.stop = shape[0]
+
+
 # ---------------------------------------------------------------------------
 # TEST CASES
 # ---------------------------------------------------------------------------
@@ -69,6 +158,67 @@ class CollectionsTest(unittest.TestCase):
             flatten_dict(input_data, max_depth=2), [{"a3": 1, "b3": 2}, 3, 4, 5]
         )
 
+    def test_flatten_dict_edge_cases(self):
+        """Tests flattening non-dicts, empty dicts and max_depth=0."""
+        self.assertEqual(flatten_dict(1), [1])
+        self.assertEqual(flatten_dict({}), [])
+        self.assertEqual(flatten_dict({"a": {}, "b": 1}), [1])
+        self.assertEqual(flatten_dict(MULTILEVEL_DICT, max_depth=0), [MULTILEVEL_DICT])
+        self.assertEqual(
+            flatten_dict(MULTILEVEL_DICT, max_depth=1), list(MULTILEVEL_DICT.values())
+        )
+
+    def test_flatten_dict_deep(self):
+        """Tests flattening a dict nested deeper than the recursion limit."""
+        depth = sys.getrecursionlimit() * 2
+        data = 1
+        for _ in range(depth):
+            data = {"a": data, "b": 2}
+        self.assertEqual(flatten_dict(data, max_depth=depth), [1] + [2] * depth)
+        self.assertEqual(len(flatten_dict(data)), 1000)  # Default max_depth is 999
+
+    def test_iflatten_dict(self):
+        """Tests lazily flattening a multilevel dict."""
+        values = iflatten_dict(MULTILEVEL_DICT, max_depth=2)
+        self.assertIsInstance(values, Iterator)
+        self.assertEqual(next(values), {"a3": 1, "b3": 2})
+        self.assertEqual(list(values), [3, 4, 5])
+
+    def test_flatten_dict_key_paths(self):
+        """Tests flattening a multilevel dict into key paths and values."""
+        self.assertEqual(
+            flatten_dict(MULTILEVEL_DICT, key_paths=True),
+            {
+                ("a1", "a2", "a3"): 1,
+                ("a1", "a2", "b3"): 2,
+                ("a1", "b2"): 3,
+                ("b1",): 4,
+                ("c1",): 5,
+            },
+        )
+        self.assertEqual(
+            list(iflatten_dict(MULTILEVEL_DICT, max_depth=2, separator=".")),
+            [("a1.a2", {"a3": 1, "b3": 2}), ("a1.b2", 3), ("b1", 4), ("c1", 5)],
+        )
+        self.assertEqual(flatten_dict({1: {2: 3}}, separator="/"), {"1/2": 3})
+        self.assertEqual(flatten_dict(1, key_paths=True), {(): 1})
+
+    def test_unflatten_dict(self):
+        """Tests rebuilding a multilevel dict from key paths."""
+        for max_depth in (1, 2, 999):
+            with self.subTest(max_depth=max_depth):
+                for kwargs in ({"key_paths": True}, {"separator": "."}):
+                    flat = flatten_dict(MULTILEVEL_DICT, max_depth, **kwargs)
+                    separator = kwargs.get("separator")
+                    self.assertEqual(unflatten_dict(flat, separator), MULTILEVEL_DICT)
+        pairs = iflatten_dict(MULTILEVEL_DICT, key_paths=True)
+        self.assertEqual(unflatten_dict(pairs), MULTILEVEL_DICT)
+        self.assertEqual(unflatten_dict({}), {})
+        with self.assertRaises(ValueError):
+            unflatten_dict({(): 1})
+        with self.assertRaises(ValueError):
+            unflatten_dict({("a",): 1, ("a", "b"): 2})
+
     def test_get_first_dict_x(self):
         """Tests the get_first_dict_* functions."""
         test_dict = {"a": 1, "b": 2, "c": 3}
@@ -86,6 +236,64 @@ class CollectionsTest(unittest.TestCase):
         input_data = MULTILEVEL_LIST
         self.assertEqual(flatten_list(input_data, max_depth=2), [[1, 2], 3, 4, 5])
 
+    def test_flatten_list_deep(self):
+        """Tests flattening a list nested deeper than the recursion limit."""
+        depth = sys.getrecursionlimit() * 2
+        data = 1
+        for _ in range(depth):
+            data = [data, 2]
+        self.assertEqual(flatten_list(data, max_depth=depth), [1] + [2] * depth)
+
+    def test_iflatten_list(self):
+        """Tests lazily flattening a multilevel list."""
+        values = iflatten_list(MULTILEVEL_LIST, max_depth=2)
+        self.assertIsInstance(values, Iterator)
+        self.assertEqual(next(values), [1, 2])
+        self.assertEqual(list(values), [3, 4, 5])
+        self.assertEqual(list(iflatten_list(5)), [5])
+        self.assertEqual(list(iflatten_list([[], [[]], 1])), [1])
+
+    def test_flatten(self):
+        """Tests flattening arbitrary containers."""
+        data = [
+            (1, [2, {3}]),
+            deque([4, "56"]),
+            {"a": 7, "b": OrderedDict(c=(8,))},
+            (n for n in (9, b"10")),
+            [],
+            "",
+        ]
+        self.assertEqual(flatten(data), [1, 2, 3, 4, "56", 7, 8, 9, b"10", ""])
+        self.assertEqual(flatten(data, max_depth=1)[:2], [(1, [2, {3}]), data[1]])
+        self.assertEqual(list(iflatten("abc")), ["abc"])
+        self.assertEqual(list(iflatten([[1, (2,)], 3], max_depth=0)), [[[1, (2,)], 3]])
+
+    def test_flatten_custom_container(self):
+        """Tests flattening only the containers accepted by a predicate."""
+        data = [(1, 2), [3, [4, "ab"]], {5: 6}]
+        self.assertEqual(
+            flatten(data, is_container=lambda d: isinstance(d, list)),
+            [(1, 2), 3, 4, "ab", {5: 6}],
+        )
+        self.assertEqual(
+            flatten(data, is_container=lambda d: isinstance(d, (list, str))),
+            [(1, 2), 3, 4, "a", "b", {5: 6}],  # Single characters are strings too
+        )
+
+    def test_flatten_arrays(self):
+        """Tests flattening array-like objects with ravel()."""
+        array = FakeArray((2, 3, 2))
+        self.assertEqual(flatten([array, 12]), list(range(13)))
+        self.assertTrue(array.ravelled)
+        self.assertEqual(flatten(FakeArray((2, 3))), list(range(6)))
+        # Arrays deeper than max_depth and object arrays are descended into
+        array = FakeArray((2, 3))
+        self.assertEqual([row.start for row in flatten([array], max_depth=2)], [0, 3])
+        self.assertFalse(array.ravelled)
+        array = FakeArray((3,), kind="O")
+        self.assertEqual(flatten(array), [0, 1, 2])
+        self.assertFalse(array.ravelled)
+
     def test_chunkify(self):
         """Tests chunkify function."""
         for chunk_size, first_exp, last_exp, count_exp in CHUNKIFY_TEST_PARAMS:
@@ -99,6 +307,47 @@ class CollectionsTest(unittest.TestCase):
         """Tests chunkify when chunk_size is not specified, making it infinite."""
         self.assertEqual(list(chunkify(LONG_LIST, None)), [LONG_LIST])
 
+    def test_chunkify_sliceable(self):
+        """Tests that lists, arrays and memoryviews are chunked by slicing."""
+        numbers = array.array("i", LONG_LIST)
+        for sequence in (LONG_LIST, numbers, memoryview(numbers)):
+            with self.subTest(type=type(sequence).__name__):
+                chunks = list(chunkify(sequence, 6))
+                self.assertEqual([len(c) for c in chunks], [6, 6, 6, 2])
+                self.assertTrue(all(type(c) is type(sequence) for c in chunks))
+                self.assertEqual(list(chain(*chunks)), LONG_LIST)
+                self.assertEqual(list(next(chunkify(sequence))), LONG_LIST)
+        self.assertEqual(list(chunkify([])), [])
+        for sequence in (LONG_LIST, iter(LONG_LIST), numbers):
+            with self.subTest(type=type(sequence).__name__, chunk_size=0):
+                self.assertEqual(list(chunkify(sequence, 0)), [])
+        # Views share memory with the input
+        chunk = list(chunkify(memoryview(numbers), 6))[1]
+        chunk[0] = 0
+        self.assertEqual(numbers[6], 0)
+        array_like = SliceableArray(list(LONG_LIST))
+        chunk = list(chunkify(array_like, 6))[3]
+        self.assertIs(chunk.data, array_like.data)
+        self.assertEqual(list(chunk), [19, 20])
+
+    def test_chunkify_equal_size(self):
+        """Tests padding or dropping the last chunk."""
+        for sequence in (LONG_LIST, iter(LONG_LIST), array.array("i", LONG_LIST)):
+            with self.subTest(type=type(sequence).__name__):
+                padded = list(chunkify(sequence, 6, pad=True, fill_value=0))
+                self.assertEqual(list(padded[-1]), [19, 20, 0, 0, 0, 0])
+                self.assertEqual(len(padded), 4)
+        self.assertEqual(len(list(chunkify(iter(LONG_LIST), 6, drop_last=True))), 3)
+        self.assertEqual(len(list(chunkify(LONG_LIST, 5, drop_last=True))), 4)
+        array_like = SliceableArray(list(LONG_LIST))
+        padded = list(chunkify(array_like, 6, pad=True, fill_value=-1))[-1]
+        self.assertEqual(list(padded), [19, 20, -1, -1, -1, -1])
+        self.assertEqual(array_like.data, LONG_LIST)  # Input is not modified
+        with self.assertRaises(TypeError):
+            list(chunkify(memoryview(b"abc"), 2, pad=True))
+        with self.assertRaises(ValueError):
+            next(chunkify(LONG_LIST, 6, pad=True, drop_last=True))
+
     def test_ichunkify(self):
         """Tests ichunkify function."""
         for chunk_size, first_exp, last_exp, count_exp in CHUNKIFY_TEST_PARAMS:
@@ -118,7 +367,106 @@ class CollectionsTest(unittest.TestCase):
 
     def test_ichunkify_infinite_chunk_size(self):
         """Tests ichunkify when chunk_size is not specified, making it infinite."""
-        self.assertEqual(list(next(ichunkify(LONG_LIST, None))), LONG_LIST)
+        for chunk_size in (None, 0):
+            with self.subTest(chunk_size=chunk_size):
+                chunks = list(ichunkify(LONG_LIST, chunk_size))
+                self.assertEqual(len(chunks), 1)
+                self.assertEqual(list(chunks[0]), LONG_LIST)
+
+    def test_ichunkify_any_order(self):
+        """Tests consuming ichunkify chunks out of order and partially."""
+        chunks = list(ichunkify(iter(LONG_LIST), 6))
+        self.assertEqual([c.index for c in chunks], [0, 1, 2, 3])
+        self.assertEqual([c.start for c in chunks], [0, 6, 12, 18])
+        self.assertEqual([c.stop for c in chunks], [6, 12, 18, 20])
+        self.assertEqual(repr(chunks[1]), "_Chunk(index=1, start=6)")
+        self.assertEqual(list(chunks[2]), [13, 14, 15, 16, 17, 18])
+        self.assertEqual(list(islice(chunks[0], 2)), [1, 2])
+        self.assertEqual(list(chunks[3]), [19, 20])
+        self.assertEqual(list(chunks[0]), [3, 4, 5, 6])
+        self.assertEqual(list(chunks[1]), [7, 8, 9, 10, 11, 12])
+        self.assertEqual(list(chunks[1]), [])
+        # Items of earlier chunks are buffered once a later chunk is yielded
+        chunks = ichunkify(iter(LONG_LIST), 3)
+        first = next(chunks)
+        self.assertEqual(list(first.buffer), [1])  # Read to check it is not empty
+        second = next(chunks)
+        self.assertEqual(list(first.buffer), [1, 2, 3])
+        self.assertEqual(list(second), [4, 5, 6])
+        self.assertEqual(list(first), [1, 2, 3])
+
+    def test_ichunkify_skipped_chunks(self):
+        """Tests that items of chunks which are not kept are not buffered."""
+        read = []
+        chunks = ichunkify((read.append(i) or i for i in LONG_LIST), 5)
+        next(chunks)  # Skipped
+        second = next(chunks)
+        self.assertEqual(read, LONG_LIST[:6])
+        self.assertEqual(list(second), [6, 7, 8, 9, 10])
+        self.assertEqual(len(second.buffer), 0)
+        single = next(ichunkify(iter(LONG_LIST)))
+        self.assertIsNone(single.stop)
+        self.assertEqual(list(single), LONG_LIST)
+        self.assertEqual(single.stop, 20)
+
+    def test_ichunkify_threads(self):
+        """Tests consuming ichunkify chunks concurrently from multiple threads."""
+        chunks = ichunkify(iter(range(10_000)), 100)
+        results = {}
+
+        def consume():
+            for chunk in chunks_queue:
+                results[chunk.index] = list(chunk)
+
+        chunks_queue = iter(list(chunks))  # Shared by the threads
+        threads = [threading.Thread(target=consume) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 100)
+        for index, items in results.items():
+            self.assertEqual(items, list(range(index * 100, (index + 1) * 100)))
+
+    def test_prefetch_chunks(self):
+        """Tests prefetch_chunks function."""
+        for chunk_size, first_exp, last_exp, count_exp in CHUNKIFY_TEST_PARAMS:
+            with self.subTest(chunk_size=chunk_size):
+                chunks = list(prefetch_chunks(iter(LONG_LIST), chunk_size, depth=1))
+                self.assertEqual(first_exp, chunks[0])
+                self.assertEqual(last_exp, chunks[-1])
+                self.assertEqual(count_exp, len(chunks))
+        self.assertEqual(list(prefetch_chunks([])), [])
+        with self.assertRaises(ValueError):
+            next(prefetch_chunks(LONG_LIST, depth=0))
+
+    def test_prefetch_chunks_reads_ahead(self):
+        """Tests that chunks are read ahead up to the depth, but no further."""
+        read = []
+        chunks = prefetch_chunks((read.append(i) or i for i in LONG_LIST), 2, 3)
+        self.assertEqual(next(chunks), [1, 2])
+        time.sleep(0.1)
+        # 3 chunks in the queue and 1 waiting to be put in
+        self.assertEqual(read, LONG_LIST[:10])
+        # Stopping early lets the background thread finish
+        chunks.close()
+        time.sleep(0.1)
+        self.assertNotIn(
+            "prefetch_chunks", [thread.name for thread in threading.enumerate()]
+        )
+        self.assertEqual(len(read), 12)
+
+    def test_prefetch_chunks_error(self):
+        """Tests that errors raised by the iterable are re-raised in order."""
+
+        def failing_source():
+            yield from range(5)
+            raise RuntimeError("Source failed.")
+
+        chunks = prefetch_chunks(failing_source(), 2)
+        self.assertEqual([next(chunks), next(chunks)], [[0, 1], [2, 3]])
+        with self.assertRaises(RuntimeError):
+            next(chunks)
 
     def test_limited_iterator(self):
         """Tests limiting the iterator to max elements."""
@@ -148,6 +496,113 @@ class CollectionsTest(unittest.TestCase):
         self.assertIn(str(kwargs_in), str(perms))  # Tests __repr__
         self.assertIn(perms.__class__.__name__, str(perms))  # Tests __repr__
 
+    def test_permutations_indexing(self):
+        """Tests accessing combinations by index and slicing the permutations."""
+        perms = Permutations(n=iter([1, 2, 3]), c=("A", "B"))
+        self.assertEqual(perms.kwargs, [perms[i] for i in range(len(perms))])
+        self.assertEqual(
+            (perms[-1], perms[3]), ({"n": 3, "c": "B"}, {"n": 2, "c": "B"})
+        )
+        with self.assertRaises(IndexError):
+            perms[6]
+        for index in (slice(1, None, 2), slice(None, None, -1), slice(2, 4)):
+            with self.subTest(index=index):
+                part = perms[index]
+                self.assertIsInstance(part, Permutations)
+                self.assertEqual(part.kwargs, perms.kwargs[index])
+                self.assertEqual(part.args, perms.args[index])
+        self.assertEqual(perms[1::2][1:].args, perms.args[3::2])
+        self.assertEqual(
+            (perms[:0].args, perms[6:].kwargs, perms[1:][-5:].args),
+            ([], [], perms.args[1:]),
+        )
+        self.assertEqual(
+            (list(Permutations()), len(Permutations(a=[], b=[1]))), ([{}], 0)
+        )
+        # Large grids are not materialised
+        perms = Permutations(a=range(10**5), b=range(10**5), c=[True, False])
+        self.assertEqual(len(perms), 2 * 10**10)
+        self.assertEqual(perms[-1], {"a": 10**5 - 1, "b": 10**5 - 1, "c": False})
+        shards = [perms[i :: 10**9] for i in range(3)]
+        self.assertEqual([len(shard) for shard in shards], [20] * 3)
+        self.assertEqual(shards[2][1], {"a": 5000, "b": 1, "c": True})
+
+    def test_permutations_sampling(self):
+        """Tests sampling subsets of combinations."""
+        perms = Permutations(a=range(4), b=range(1000), c=range(1000))
+        for method in ("random", "lhs", "halton"):
+            with self.subTest(method=method):
+                sample = perms.sample(8, seed=1, method=method)
+                self.assertIsInstance(sample, Permutations)
+                self.assertEqual(len(sample), 8)
+                self.assertEqual(sample.args, sorted(sample.args))
+                self.assertEqual(
+                    sample.args, perms.sample(8, seed=1, method=method).args
+                )
+                self.assertNotEqual(
+                    sample.args, perms.sample(8, seed=2, method=method).args
+                )
+                if method != "random":  # Each value of a is chosen twice
+                    self.assertEqual(set(Counter(k["a"] for k in sample).values()), {2})
+                # Only combinations of the sliced permutations are chosen
+                part = perms[1::2].sample(10, seed=1, method=method)
+                self.assertTrue(all(args[2] % 2 for args in part.args))
+                self.assertLessEqual(len(part.sample(3, seed=1, method=method)), 3)
+        small = Permutations(a=[1, 2], b="xy")
+        self.assertEqual(small.sample(10).args, small.args)
+        self.assertEqual(
+            len(small.sample(10, seed=0, method="lhs")), 4
+        )  # Duplicates removed
+        self.assertEqual(Permutations().sample(3, method="halton").kwargs, [{}])
+        with self.assertRaises(ValueError):
+            small.sample(1, method="sobol")
+
+    def test_permutations_constraints(self):
+        """Tests excluding invalid combinations with constraints."""
+        perms = Permutations(fast=[5, 10, 20], slow=[10, 20, 50], step=[1, 2, 3])
+        constraints = (
+            lambda fast, slow: fast < slow,
+            lambda step, fast: step < 3 or fast == 10,
+        )
+        expected = [
+            (fast, slow, step)
+            for fast, slow, step in perms.args
+            if fast < slow and (step < 3 or fast == 10)
+        ]
+        constrained = perms.where(*constraints)
+        self.assertEqual(len(constrained), len(expected))
+        self.assertEqual(constrained.args, expected)
+        self.assertEqual(constrained[-1], {"fast": 20, "slow": 50, "step": 2})
+        self.assertEqual(constrained[1::3].args, expected[1::3])
+        self.assertEqual(
+            perms.where(constraints[0]).where(constraints[1]).args, expected
+        )
+        # Listed combinations are filtered
+        self.assertEqual(perms[::-1].where(*constraints).args, expected[::-1])
+        self.assertEqual(
+            constrained[:].where(lambda slow: slow > 10).args, expected[2:]
+        )
+        sample = perms.where(*constraints).sample(20, seed=1, method="halton")
+        self.assertTrue(set(sample.args) <= set(expected))
+        self.assertEqual(constrained.sample(100, seed=1).args, expected)
+        for names in ("fast, other", ""):
+            with self.assertRaises(ValueError):
+                perms.where(eval(f"lambda {names}: True"))
+
+    def test_permutations_pruning(self):
+        """Tests that combinations starting with an invalid choice are skipped."""
+        calls = []
+
+        def is_even(a):
+            calls.append(a)
+            return a % 2 == 0
+
+        perms = Permutations(a=range(10), b=range(100), c=range(1000)).where(is_even)
+        self.assertEqual(len(perms), 5 * 10**5)
+        self.assertEqual(perms[-1], {"a": 8, "b": 99, "c": 999})
+        self.assertEqual(perms[:3].args, [(0, 0, 0), (0, 0, 1), (0, 0, 2)])
+        self.assertEqual(len(calls), 20)  # Counted and listed once each
+
 
 class MasterDictTest(unittest.TestCase):
     """
@@ -187,6 +642,287 @@ class MasterDictTest(unittest.TestCase):
         self.assertEqual(str(self.master), display)
 
 
+class FakeTimer:
+    """A manually advanced clock for testing TTLCache."""
+
+    def __init__(self) -> None:
+        self.time = 0.0
+
+    def __call__(self) -> float:
+        return self.time
+
+
+class BoundedCacheTest(unittest.TestCase):
+    """
+    Tests bounded caches and their memory budget in MasterDict.
+    """
+
+    def test_lru_cache(self):
+        """Tests evicting the least recently used entry."""
+        cache = LRUCache(maxsize=3)
+        for key in "abc":
+            cache[key] = key.upper()
+        self.assertEqual(cache["a"], "A")  # "b" is now least recently used
+        self.assertIn("b", cache)  # Does not count as an access
+        cache["d"] = "D"
+        self.assertEqual(list(cache), ["a", "c", "d"])
+        cache["c"] = "C2"  # Updating counts as an access
+        cache["e"] = "E"
+        self.assertEqual(dict(cache.items()), {"c": "C2", "d": "D", "e": "E"})
+        self.assertEqual(cache.evict(), ("d", "D"))
+        self.assertEqual(repr(cache), "LRUCache({'c': 'C2', 'e': 'E'})")
+        self.assertIsNone(cache.get("x"))
+        with self.assertRaises(KeyError):
+            cache.pop("x")
+        self.assertEqual(cache.pop("x", 0), 0)
+
+    def test_lfu_cache(self):
+        """Tests evicting the least frequently used entry."""
+        cache = LFUCache(maxsize=3)
+        for key, uses in (("a", 3), ("b", 1), ("c", 2)):
+            cache[key] = key
+            for _ in range(uses):
+                cache[key]
+        cache["d"] = "d"  # "b" is used least
+        self.assertEqual(sorted(cache), ["a", "c", "d"])
+        cache["e"] = "e"  # "d" has been used least, once when set
+        self.assertEqual(sorted(cache), ["a", "c", "e"])
+        del cache["e"]
+        cache["c"] = "c2"  # Updating counts as a use
+        cache["f"] = "f"
+        cache["g"] = "g"  # "f" is used least, "a" and "c" are used 4 times
+        self.assertEqual(sorted(cache), ["a", "c", "g"])
+        del cache["g"]  # The least frequently used entry is deleted
+        self.assertEqual(cache.evict(), ("a", "a"))  # Least recent of equals
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+    def test_ttl_cache(self):
+        """Tests expiring entries after their time to live."""
+        timer = FakeTimer()
+        cache = TTLCache(10, maxsize=2, timer=timer)
+        cache["a"] = 1
+        timer.time = 5
+        cache["b"] = 2
+        self.assertEqual(cache["a"], 1)
+        timer.time = 10
+        self.assertNotIn("a", cache)
+        with self.assertRaises(KeyError):
+            cache["a"]
+        self.assertEqual(list(cache), ["b"])
+        cache["b"] = 3  # Resets the time to live
+        cache["c"] = 4
+        timer.time = 16
+        self.assertEqual(dict(cache.items()), {"b": 3, "c": 4})
+        cache["d"] = 5  # Evicts "b", the oldest entry
+        self.assertEqual(list(cache), ["c", "d"])
+        timer.time = 30
+        cache["e"] = 6  # Removes expired entries
+        self.assertEqual(list(cache), ["e"])
+        cache.expire()
+        self.assertEqual(cache.get("e"), 6)
+
+    def test_maxbytes(self):
+        """Tests limiting the size of values in bytes."""
+        cache = LRUCache(maxbytes=100, getsizeof=len)
+        cache["a"] = b"a" * 40
+        cache["b"] = b"b" * 40
+        cache["a"] = b"a" * 70  # "b" is least recently used
+        self.assertEqual((list(cache.values()), cache.nbytes), ([b"a" * 70], 70))
+        cache["c"] = b"c" * 101  # Too large to be kept at all
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+        with self.assertRaises(KeyError):
+            cache.evict()
+        self.assertIsInstance(cache, BoundedCache)
+        with self.assertRaises(TypeError):
+            BoundedCache()
+
+    def test_master_budget(self):
+        """Tests evicting the least recently used entries across caches."""
+        timer = FakeTimer()
+        master = MasterDict(
+            _maxbytes=100,
+            lru=LRUCache(getsizeof=len),
+            ttl=TTLCache(10, getsizeof=len, timer=timer),
+            plain={"x": b"x" * 1000},  # Not under the budget
+        )
+        master.lru["a"] = b"a" * 30
+        master.ttl["b"] = b"b" * 30
+        master.lru["c"] = b"c" * 30
+        master.ttl["b"]
+        master.lru["d"] = b"d" * 30  # "a" is the least recently used
+        self.assertEqual(sorted(master.lru), ["c", "d"])
+        self.assertEqual(master.nbytes, 90)
+        timer.time = 10  # "b" expires and is evicted first
+        master.lru["e"] = b"e" * 30
+        self.assertEqual((sorted(master.lru), list(master.ttl)), (["c", "d", "e"], []))
+        master.lfu = LFUCache(getsizeof=len)  # Added under the budget
+        master.lfu["f"] = b"f" * 20
+        self.assertEqual(sorted(master.lru), ["d", "e"])
+        master.lfu["g"] = b"g" * 200
+        self.assertEqual(master.nbytes, 0)
+        self.assertEqual(master.as_dict().keys(), {"lru", "ttl", "plain", "lfu"})
+        master.delete_keys("x")
+        master.clear_all()
+        self.assertEqual(master.plain, {})
+        unlimited = MasterDict(cache=LRUCache())
+        unlimited.cache[1] = "1"
+        self.assertEqual(unlimited.nbytes, sys.getsizeof("1"))
+
+    def test_master_option_names(self):
+        """Tests that options do not take over sub-dict names."""
+        master = MasterDict(
+            maxbytes={"a": 1}, index_keys={}, cache=LRUCache(getsizeof=len)
+        )
+        self.assertEqual((master.maxbytes, master.index_keys), ({"a": 1}, {}))
+        master.cache["b"] = "b" * 1000  # Not under a budget
+        self.assertEqual(master.nbytes, 1000)
+        with self.assertRaises(TypeError):
+            MasterDict(_lock={})
+
+    def test_stats(self):
+        """Tests counting hits, misses and evictions."""
+        timer = FakeTimer()
+        cache = TTLCache(10, maxsize=2, getsizeof=len, timer=timer)
+        self.assertIsNone(cache.stats().hit_rate)
+        cache["a"] = "aa"
+        cache["a"]
+        cache.get("b")
+        cache["b"] = "b"
+        cache["c"] = "c"  # Evicts "a"
+        timer.time = 10
+        self.assertIsNone(cache.get("b"))  # Expired
+        self.assertEqual(cache.stats(), CacheStats(1, 2, 2, 1, 1))
+        cache.expire()
+        self.assertEqual(cache.stats(), CacheStats(1, 2, 3, 0, 0))
+        self.assertAlmostEqual(cache.stats().hit_rate, 1 / 3)
+        master = MasterDict(cache=cache, plain={1: 1})
+        self.assertEqual(
+            master.stats(),
+            {"cache": cache.stats(), "plain": CacheStats(None, None, None, 1, None)},
+        )
+
+    def test_key_index(self):
+        """Tests that indexed keys are deleted only from the caches holding them."""
+        master = MasterDict(
+            _index_keys=True,
+            first=LRUCache(),
+            second=LFUCache(),
+            plain={"a": 1, "b": 2},
+        )
+        master.first.update(a=1, b=2)
+        master.second.update(b=2, c=3)
+        with mock.patch.object(LRUCache, "pop", wraps=master.first.pop) as pop:
+            master.delete_keys("c", "x")
+            pop.assert_not_called()
+            master.delete_keys("b")
+            pop.assert_called_once_with("b", None)
+        self.assertEqual(
+            master.as_dict(), {"first": {"a": 1}, "second": {}, "plain": {"a": 1}}
+        )
+        # Replaced and removed caches leave the index
+        third = LRUCache()
+        third["a"] = 1
+        old, master.first = master.first, third
+        old["c"] = 3
+        master.delete_keys("a", "c")
+        self.assertEqual((dict(old.items()), len(third)), ({"a": 1, "c": 3}, 0))
+        third["d"] = 4
+        del master.first
+        master.delete_keys("d")
+        self.assertEqual(dict(third.items()), {"d": 4})
+        master.second["e"] = 5
+        master.clear_all()
+        self.assertEqual(master._key_index, {})
+
+
+class MemoizeTest(unittest.TestCase):
+    def test_memoize(self):
+        """Tests caching results under the arguments of the call."""
+        calls = []
+
+        @memoize(maxsize=2)
+        def add(a, b=0):
+            calls.append((a, b))
+            return a + b
+
+        self.assertEqual(
+            [add(1), add(1), add(1, 2), add(1, b=2), add(1, b=2)], [1] * 2 + [3] * 3
+        )
+        self.assertEqual(calls, [(1, 0), (1, 2), (1, 2)])
+        self.assertEqual(add.__name__, "add")
+        self.assertEqual(add.cache.stats()[:3], (2, 3, 1))
+        self.assertEqual(list(add.cache), [(1, 2), (1, mock.ANY, ("b", 2))])
+
+    def test_memoize_master(self):
+        """Tests registering the cache in a master dict and invalidating keys."""
+        master = MasterDict(_index_keys=True)
+        timer = FakeTimer()
+
+        @memoize(master, maxbytes=100)
+        def square(x):
+            return x * x
+
+        @memoize(master, name="cubes", ttl=10)
+        def cube(x):
+            return x**3
+
+        self.assertIsInstance(cube.cache, TTLCache)
+        self.assertEqual(
+            master.as_dict(), {"square": square.cache, "cubes": cube.cache}
+        )
+        cube.cache._timer = timer
+        self.assertEqual([square(2), square(3), cube(2), cube(1)], [4, 9, 8, 1])
+        master.delete_keys(2)
+        self.assertEqual((list(square.cache), list(cube.cache)), ([3], [1]))
+        timer.time = 10
+        self.assertEqual(len(cube.cache), 1)
+        self.assertEqual(cube(1), 1)  # Recomputed after expiring
+        self.assertEqual(cube.cache.stats()[:3], (0, 3, 1))
+
+    def test_memoize_single_flight(self):
+        """Tests that concurrent calls with the same arguments compute only once."""
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        @memoize()
+        def slow(x):
+            calls.append(x)
+            started.set()
+            release.wait(5)
+            if x < 0:
+                raise ValueError(x)
+            return x
+
+        for argument in (1, -1):
+            calls.clear()
+            started.clear()
+            release.clear()
+            results = []
+
+            def call():
+                try:
+                    results.append(slow(argument))
+                except ValueError as error:
+                    results.append(error)
+
+            threads = [threading.Thread(target=call) for _ in range(4)]
+            threads[0].start()
+            started.wait(5)
+            for thread in threads[1:]:
+                thread.start()
+            time.sleep(0.1)  # Let the other threads wait for the result
+            release.set()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(calls, [argument])
+            self.assertEqual(len(results), 4)
+            self.assertTrue(all(repr(r) == repr(results[0]) for r in results))
+        self.assertEqual(list(slow.cache), [1])  # Exceptions are not cached
+        self.assertEqual(slow(1), 1)
+
+
 class BaseMappingTest(unittest.TestCase):
     """
     Tests BaseMapping class.
@@ -259,6 +995,84 @@ class BaseMappingTest(unittest.TestCase):
                 skip_exceptions=(TypeError,),
             )
 
+    def test_getter_fast_path(self):
+        """Tests that itemgetter and attrgetter mappings match the general ones."""
+        for condition, skip in (
+            (None, (AttributeError,)),
+            (self.is_less_than_30, (TypeError, AttributeError)),
+        ):
+            mapping = BaseMapping(
+                PEOPLE + CORRUPT_PEOPLE,
+                attrgetter("name"),
+                attrgetter("age"),
+                condition,
+                skip_exceptions=skip,
+            )
+            expected = BaseMapping(
+                PEOPLE + CORRUPT_PEOPLE,
+                lambda p: p.name,
+                lambda p: p.age,
+                condition,
+                skip_exceptions=skip,
+            )
+            self.assertEqual(list(mapping.items()), list(expected.items()))
+        with self.assertRaises(AttributeError):
+            BaseMapping(CORRUPT_PEOPLE, attrgetter("name"), attrgetter("age"))
+        rows = iter([("a", 1), ("b",), ("a", 3), {}, ("c", 4)])
+        mapping = BaseMapping(
+            rows, itemgetter(0), itemgetter(1), skip_exceptions=(IndexError, KeyError)
+        )
+        self.assertEqual(list(mapping.items()), [("a", 3), ("c", 4)])
+
+    def test_custom_setitem(self):
+        """Tests that overridden __setitem__ is called for each item."""
+
+        class UpperKeys(BaseMapping):
+            def __setitem__(self, key, value):
+                super().__setitem__(key.upper(), value)
+
+        for kwargs in ({}, {"chunk_size": 2, "backend": "thread"}):
+            mapping = UpperKeys(
+                [("a", 1), ("b", 2), ("c", 3)], itemgetter(0), itemgetter(1), **kwargs
+            )
+            self.assertEqual(mapping, {"A": 1, "B": 2, "C": 3})
+
+    def test_parallel_mapping(self):
+        """Tests building the mapping from chunks of items in parallel."""
+        for getters, backend in (
+            ((self.first_name_getter, self.age_getter), "thread"),
+            ((attrgetter("name"), attrgetter("age")), "process"),
+        ):
+            with self.subTest(backend=backend):
+                people = (PEOPLE + CORRUPT_PEOPLE) * 3
+                kwargs = {"skip_exceptions": (TypeError, AttributeError)}
+                mapping = BaseMapping(
+                    people, *getters, chunk_size=2, backend=backend, **kwargs
+                )
+                expected = BaseMapping(people, *getters, **kwargs)
+                self.assertEqual(list(mapping.items()), list(expected.items()))
+                with self.assertRaises(AttributeError):
+                    BaseMapping(people, *getters, chunk_size=2, backend=backend)
+
+    def test_from_columns(self):
+        """Tests creating a mapping from columns of keys and values."""
+
+        class Column(list):
+            def tolist(self):
+                return list(self)
+
+        class NameToAge(BaseMapping):
+            def __init__(self, people):
+                super().__init__(people, attrgetter("name"), attrgetter("age"))
+
+        names = [person.name for person in PEOPLE]
+        ages = Column(person.age for person in PEOPLE)
+        mapping = NameToAge.from_columns(names, ages)
+        self.assertIsInstance(mapping, NameToAge)
+        self.assertEqual(mapping, NameToAge(PEOPLE))
+        mapping = BaseMapping.from_columns(names, ages, mask=Column([1, 0, 1]))
+        self.assertEqual(mapping, {"John Doe": 27, "David Hume": 313})
+
     def test_repr(self):
         """Tests that __repr__ magic method displays the name of the derived class."""
 
@@ -327,5 +1141,137 @@ class BaseMappingTest(unittest.TestCase):
         self.assertEqual(mapping, BaseMapping.invert(inverse_mapping))
 
 
+class BidirectionalMappingTest(unittest.TestCase):
+    """
+    Tests BidirectionalMapping class.
+    """
+
+    def test_construction(self):
+        """Tests that the inverse is built with the mapping."""
+        mapping = BidirectionalMapping(PEOPLE, attrgetter("name"), attrgetter("age"))
+        self.assertEqual(mapping, {"John Doe": 27, "Jane Doe": 39, "David Hume": 313})
+        self.assertEqual(mapping.inverse[27], "John Doe")
+        self.assertEqual(mapping.invert(strict=True), BaseMapping.invert(mapping))
+        with self.assertRaises(TypeError):
+            mapping.inverse[27] = "Someone"  # Read-only
+        rows = [("a", 1), ("b", 1), ("a", 2), ("c", 1)]
+        with self.assertRaises(ValueError):
+            BidirectionalMapping(rows, itemgetter(0), itemgetter(1))
+        mapping = BidirectionalMapping(
+            rows, itemgetter(0), itemgetter(1), skip_exceptions=(ValueError,)
+        )
+        self.assertEqual(dict(mapping.inverse), {2: "a", 1: "c"})
+        mapping = BidirectionalMapping.from_columns(["a", "b"], [1, 2])
+        self.assertEqual(dict(mapping.inverse), {1: "a", 2: "b"})
+
+    def test_modification(self):
+        """Tests that the inverse is updated when the mapping is modified."""
+        mapping = BidirectionalMapping([], None, None)
+        mapping["a"] = 1
+        mapping["a"] = 1
+        mapping["a"] = 2
+        mapping.update({"b": 3}, c=4)
+        mapping |= {"d": 5}
+        self.assertEqual(dict(mapping.inverse), {2: "a", 3: "b", 4: "c", 5: "d"})
+        with self.assertRaises(ValueError):
+            mapping["e"] = 2
+        with self.assertRaises(TypeError):
+            mapping["e"] = []  # Unhashable values cannot be inverted
+        self.assertEqual(
+            (mapping.setdefault("a", 6), mapping.setdefault("e", 6)), (2, 6)
+        )
+        del mapping["b"]
+        self.assertEqual((mapping.pop("c"), mapping.pop("x", None)), (4, None))
+        with self.assertRaises(KeyError):
+            mapping.pop("x")
+        self.assertEqual(mapping.popitem(), ("e", 6))
+        self.assertEqual(dict(mapping.inverse), {2: "a", 5: "d"})
+        copy = pickle.loads(pickle.dumps(mapping))
+        self.assertEqual((copy, dict(copy.inverse)), (mapping, dict(mapping.inverse)))
+        mapping.clear()
+        self.assertEqual((len(mapping), len(mapping.inverse)), (0, 0))
+
+
+class CompactMappingTest(unittest.TestCase):
+    """
+    Tests CompactMapping class.
+    """
+
+    def test_compact_columns(self):
+        """Tests looking up keys stored in compact and generic columns."""
+        for rows in (
+            [(7, 70), (-1, 2**40), (-2, -5), (3, 0)],  # -1 and -2 have equal hashes
+            [(2**70, 1.5), (0, 2.5)],
+            [("John", "Doe"), ("Jane", "Dóe"), ("", "")],
+            [((1, 2), True), ("a", None), (1.5, [])],
+        ):
+            with self.subTest(rows=rows):
+                mapping = CompactMapping(rows, itemgetter(0), itemgetter(1))
+                expected = dict(rows)
+                self.assertEqual(mapping, expected)
+                self.assertEqual(len(mapping), len(expected))
+                self.assertEqual(
+                    sorted(map(repr, mapping)), sorted(map(repr, expected))
+                )
+                for key, value in rows:
+                    self.assertIn(key, mapping)
+                    self.assertEqual(mapping[key], value)
+                for key in (-3, "x", (1, 3)):
+                    self.assertNotIn(key, mapping)
+                    with self.assertRaises(KeyError):
+                        mapping[key]
+                with self.assertRaises(TypeError):
+                    mapping[[]]  # Unhashable
+        mapping = CompactMapping([(-1, 1)], itemgetter(0), itemgetter(1))
+        self.assertNotIn(-2, mapping)  # Same hash as -1
+
+    def test_memory(self):
+        """Tests that ints, floats and strings are stored in arrays."""
+        rows = [(f"key{i}", i) for i in range(1000)]
+        mapping = CompactMapping(rows, itemgetter(0), itemgetter(1))
+        self.assertEqual(mapping._values.typecode, "h")
+        self.assertIsInstance(mapping._keys, _StringColumn)
+        mapping = CompactMapping(rows, itemgetter(1), lambda r: r[1] / 2)
+        self.assertEqual((mapping._keys.typecode, mapping._values.typecode), ("h", "d"))
+        self.assertIs(mapping._hashes, mapping._keys)
+
+    def test_construction(self):
+        """Tests that the constructor matches BaseMapping."""
+        args = (PEOPLE + CORRUPT_PEOPLE, attrgetter("name"), attrgetter("age"))
+        kwargs = {"skip_exceptions": (TypeError, AttributeError)}
+        mapping = CompactMapping(*args, BaseMappingTest.is_less_than_30, **kwargs)
+        self.assertEqual(mapping, {"John Doe": 27})
+        mapping = CompactMapping(*args, chunk_size=2, backend="thread", **kwargs)
+        self.assertEqual(mapping, BaseMapping(*args, **kwargs))
+        self.assertEqual(
+            mapping.invert(strict=True), BaseMapping(*args, **kwargs).invert()
+        )
+        self.assertTrue(repr(mapping).startswith("CompactMapping({"))
+        mapping = CompactMapping.from_columns(["a", "b", "a"], [1, 2, 3], [1, 1, 1])
+        self.assertEqual(mapping, {"a": 3, "b": 2})
+        copy = pickle.loads(pickle.dumps(mapping))
+        self.assertEqual((type(copy), copy), (CompactMapping, mapping))
+
+    def test_get_many(self):
+        """Tests looking up many keys at once."""
+
+        class Column(list):
+            def tolist(self):
+                return list(self)
+
+        mapping = CompactMapping([("a", 1), ("b", 2)], itemgetter(0), itemgetter(1))
+        self.assertEqual(mapping.get_many(["b", "c", "a"]), [2, None, 1])
+        self.assertEqual(mapping.get_many(Column(["c", "a"]), default=0), [0, 1])
+
+    def test_string_column(self):
+        """Tests the sequence interface of string columns."""
+        column = _StringColumn(["ab", "", "ç"])
+        self.assertEqual((list(column), len(column)), (["ab", "", "ç"], 3))
+        self.assertEqual((column[0], column[-1], column[-3]), ("ab", "ç", "ab"))
+        for index in (3, -4):
+            with self.assertRaises(IndexError):
+                column[index]
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,8 +1,34 @@
+import asyncio
+import concurrent.futures
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
-from multiprocessing import cpu_count
+from concurrent.futures.process import BrokenProcessPool
 from unittest import mock
 
-from jacktrade import do_multicore_work
+from jacktrade import (
+    FailedTask,
+    Permutations,
+    WorkStats,
+    available_cpus,
+    do_multicore_work,
+    iter_unpickle,
+    limit_threads,
+    numa_nodes,
+    pmap_chunks,
+    sweep,
+)
+from jacktrade.multicore import (
+    THREAD_LIMIT_ENV_VARS,
+    _assign_worker_cpus,
+    _parse_cpu_list,
+    _pin_worker,
+    _terminate_executor,
+)
 
 # ---------------------------------------------------------------------------
 # TEST FIXTURES
@@ -20,6 +46,68 @@ def worker(first, second) -> tuple:
     return (first, second)
 
 
+def affinity_worker(*args) -> frozenset:
+    """Returns the set of CPUs the worker process is allowed to run on."""
+    return frozenset(os.sched_getaffinity(0))
+
+
+def env_worker(var: str) -> str:
+    """Returns the value of an environment variable inside the worker process."""
+    return os.environ.get(var)
+
+
+def crashing_worker(number: int) -> int:
+    """
+    Kills its own process when given 3, otherwise returns the number after a short
+    delay, so that bystanders are still running when the process is killed.
+    """
+    if number == 3:
+        os._exit(1)
+    time.sleep(0.3)
+    return number
+
+
+def hanging_worker(number: int) -> int:
+    """Hangs when given 3, otherwise returns the number after a short delay."""
+    time.sleep({1: 1.5, 3: 60, 4: 2.4, 5: 1.5}.get(number, 0))
+    return number
+
+
+def failing_worker(number: int) -> int:
+    """Always raises an exception."""
+    raise ValueError(number)
+
+
+async def async_worker(first, second) -> tuple:
+    """Coroutine version of the sample worker."""
+    await asyncio.sleep(0)
+    return (first, second)
+
+
+def odd_chunk_worker(chunk: list) -> int:
+    """Returns the sum of the chunk, or raises an exception if the sum is odd."""
+    if sum(chunk) % 2:
+        raise ValueError(chunk)
+    return sum(chunk)
+
+
+async def async_sum(chunk: list) -> int:
+    """Coroutine version of sum."""
+    await asyncio.sleep(0)
+    return sum(chunk)
+
+
+def divide(x: int, y: int) -> int:
+    """Returns the integer division of x by y."""
+    return x // y
+
+
+async def async_divide(x: int, y: int) -> int:
+    """Coroutine version of divide."""
+    await asyncio.sleep(0)
+    return x // y
+
+
 # ---------------------------------------------------------------------------
 # TEST CASES
 # ---------------------------------------------------------------------------
@@ -37,7 +125,7 @@ class MulticoreTest(unittest.TestCase):
 
     def test_no_args_or_kwargs_provided(self):
         """Tests that the function exits gracefully if no args or kwargs are provided."""
-        do_multicore_work(worker)  # if It doesn't raise an exception, the test passes
+        self.assertEqual(do_multicore_work(worker), [])
 
     def test_args_provided(self):
         """Tests providing positional arguments to the worker."""
@@ -67,19 +155,793 @@ class MulticoreTest(unittest.TestCase):
         )
         self.assertEqual(set(self.results), set(COMBINED))
 
-    @mock.patch("concurrent.futures.as_completed")
-    @mock.patch("concurrent.futures.ProcessPoolExecutor")
-    def test_idle_cpus(self, mock_executor, mock_as_completed):
+    @mock.patch(
+        "concurrent.futures.ProcessPoolExecutor",
+        wraps=concurrent.futures.ThreadPoolExecutor,
+    )
+    def test_idle_cpus(self, mock_executor):
         """Tests the use of idle_cpus parameter."""
         # Test params are (idle_cpus, max_workers)
-        test_params = [(1, max(cpu_count() - 1, 1)), (cpu_count() + 1, 1)]
+        cpu_count = len(available_cpus())
+        test_params = [(1, max(cpu_count - 1, 1)), (cpu_count + 1, 1)]
         for idle_cpus, max_workers in test_params:
             with self.subTest(idle_cpus=idle_cpus, max_workers=max_workers):
-                mock_as_completed.return_value = []
                 do_multicore_work(
                     worker, args=zip(NUMBERS, LETTERS), idle_cpus=idle_cpus
                 )
-                mock_executor.assert_called_with(max_workers)
+                self.assertEqual(mock_executor.call_args.args, (max_workers,))
+
+    @unittest.skipUnless(hasattr(os, "sched_setaffinity"), "CPU affinity unsupported")
+    def test_pin_cpus(self):
+        """Tests pinning each worker process to a single CPU core."""
+        for numa_aware in (False, True):
+            with self.subTest(numa_aware=numa_aware):
+                self.results = []
+                do_multicore_work(
+                    affinity_worker,
+                    args=zip(NUMBERS),
+                    worker_done_callback=self.worker_done_callback,
+                    pin_cpus=True,
+                    numa_aware=numa_aware,
+                )
+                self.assertEqual(len(self.results), len(NUMBERS))
+                for cpus in self.results:
+                    self.assertEqual(len(cpus), 1)
+                    self.assertTrue(cpus <= set(available_cpus()))
+
+    @unittest.skipUnless(hasattr(os, "sched_setaffinity"), "CPU affinity unsupported")
+    def test_pin_cpus_more_workers_than_cpus(self):
+        """Tests that workers beyond the number of CPUs share CPUs instead of hanging."""
+        max_workers = len(available_cpus()) + 2
+        do_multicore_work(
+            affinity_worker,
+            args=zip(range(2 * max_workers)),
+            worker_done_callback=self.worker_done_callback,
+            pin_cpus=True,
+            max_workers=max_workers,
+            timeout=30,
+        )
+        self.assertEqual(len(self.results), 2 * max_workers)
+        self.assertTrue(all(len(cpus) == 1 for cpus in self.results))
+
+    def test_worker_threads(self):
+        """Tests capping the number of threads native libraries spawn in workers."""
+        var = THREAD_LIMIT_ENV_VARS[0]
+        do_multicore_work(
+            env_worker,
+            args=[(var,)],
+            worker_done_callback=self.worker_done_callback,
+            worker_threads=1,
+        )
+        self.assertEqual(self.results, ["1"])
+
+
+@mock.patch("jacktrade.multicore.available_cpus", return_value=[0, 1, 2])
+class FaultToleranceTest(unittest.TestCase):
+    """
+    Tests recovering from failed, crashed and hung workers.
+    Three workers are always used so that failures have bystanders.
+    """
+
+    def setUp(self) -> None:
+        self.results = []
+        self.errors = []
+
+    def worker_done_callback(self, future):
+        """Records results and errors of finished workers."""
+        if future.exception() is None:
+            self.results.append(future.result())
+        else:
+            self.errors.append(future.exception())
+
+    def test_crashed_worker(self, _):
+        """Tests that a crashed worker does not fail its bystanders or the batch."""
+        failed_tasks = do_multicore_work(
+            crashing_worker,
+            args=zip(NUMBERS),
+            worker_done_callback=self.worker_done_callback,
+        )
+        self.assertEqual(sorted(self.results), [1, 2, 4, 5])
+        self.assertEqual(len(failed_tasks), 1)
+        self.assertIsInstance(failed_tasks[0], FailedTask)
+        self.assertEqual(failed_tasks[0].args, (3,))
+        self.assertEqual(failed_tasks[0].kwargs, {})
+        self.assertEqual(failed_tasks[0].attempts, 1)
+        self.assertIsInstance(failed_tasks[0].error, BrokenProcessPool)
+        self.assertEqual(len(self.errors), 1)
+
+    def test_crashed_worker_retries(self, _):
+        """Tests that a crashing task is retried in a respawned pool."""
+        failed_tasks = do_multicore_work(
+            crashing_worker,
+            args=zip(NUMBERS),
+            worker_done_callback=self.worker_done_callback,
+            retries=1,
+        )
+        self.assertEqual(sorted(self.results), [1, 2, 4, 5])
+        self.assertEqual([t.attempts for t in failed_tasks], [2])
+
+    def test_timeout(self, _):
+        """Tests that a hung task is killed while its bystanders succeed."""
+        # Task 3 hangs from the start, task 4 runs when the timeout expires after 3 s
+        # and finishes at 3.9 s, which is after or before the pool is terminated.
+        for terminate_delay in (0, 1.5):
+            with self.subTest(terminate_delay=terminate_delay):
+                self.setUp()
+
+                def delayed_terminate(executor):
+                    time.sleep(terminate_delay)
+                    _terminate_executor(executor)
+
+                start = time.monotonic()
+                with mock.patch(
+                    "jacktrade.multicore._terminate_executor", delayed_terminate
+                ):
+                    failed_tasks = do_multicore_work(
+                        hanging_worker,
+                        args=[(3,), (1,), (5,), (4,), (2,)],
+                        worker_done_callback=self.worker_done_callback,
+                        timeout=3,
+                    )
+                self.assertLess(time.monotonic() - start, 30)
+                self.assertEqual(sorted(self.results), [1, 2, 4, 5])
+                self.assertEqual(len(failed_tasks), 1)
+                self.assertEqual(failed_tasks[0].args, (3,))
+                self.assertEqual(failed_tasks[0].attempts, 1)
+                self.assertIsInstance(failed_tasks[0].error, TimeoutError)
+                self.assertIsInstance(self.errors[0], TimeoutError)
+
+    def test_retries_with_backoff(self, _):
+        """Tests retrying a failing task with an exponential backoff."""
+        start = time.monotonic()
+        failed_tasks = do_multicore_work(
+            failing_worker,
+            args=[(1,)],
+            worker_done_callback=self.worker_done_callback,
+            retries=2,
+            retry_backoff=0.2,
+        )
+        # Retries are delayed by 0.2 s and 0.4 s
+        self.assertGreaterEqual(time.monotonic() - start, 0.6)
+        self.assertEqual(len(failed_tasks), 1)
+        self.assertEqual(failed_tasks[0].attempts, 3)
+        self.assertIsInstance(failed_tasks[0].error, ValueError)
+        self.assertEqual(len(self.errors), 1)  # Reported only after the last attempt
+
+    def test_callback_exception_with_hung_worker(self, _):
+        """Tests that an exception does not wait for a hung worker to finish."""
+
+        def raising_callback(future):
+            raise RuntimeError("Callback failed.")
+
+        start = time.monotonic()
+        with self.assertRaises(RuntimeError):
+            do_multicore_work(
+                hanging_worker,
+                args=[(3,), (1,)],
+                worker_done_callback=raising_callback,
+            )
+        self.assertLess(time.monotonic() - start, 30)
+
+    def test_terminate_executor(self, _):
+        """Tests terminating the pool with public and private APIs."""
+        executor = mock.Mock(spec=["terminate_workers"])
+        _terminate_executor(executor)
+        executor.terminate_workers.assert_called_once()
+        executor = mock.Mock(spec=concurrent.futures.ThreadPoolExecutor)
+        _terminate_executor(executor)
+        executor.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+        process = mock.Mock()
+        executor = mock.Mock(spec=["_processes", "shutdown"], _processes={1: process})
+        _terminate_executor(executor)
+        process.terminate.assert_called_once()
+        executor.shutdown.assert_called_once_with(wait=True, cancel_futures=True)
+
+
+class BackendTest(unittest.TestCase):
+    """
+    Tests running the work on thread and asyncio backends.
+    """
+
+    def setUp(self) -> None:
+        self.results = []
+        self.errors = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def worker_done_callback(self, future):
+        """Records results and errors of finished workers."""
+        if future.exception() is None:
+            self.results.append(future.result())
+        else:
+            self.errors.append(future.exception())
+
+    def track_concurrency(self, delta: int) -> None:
+        """Tracks the maximum number of concurrently running tasks."""
+        with self.lock:
+            self.active += delta
+            self.max_active = max(self.max_active, self.active)
+
+    def test_invalid_backend(self):
+        """Tests that an unknown backend is rejected."""
+        with self.assertRaises(ValueError):
+            do_multicore_work(worker, args=zip(NUMBERS, LETTERS), backend="fibre")
+
+    def test_asyncio_backend_requires_coroutine(self):
+        """Tests that the asyncio backend rejects a regular function."""
+        with self.assertRaises(TypeError):
+            do_multicore_work(worker, args=zip(NUMBERS, LETTERS), backend="asyncio")
+
+    def test_thread_backend(self):
+        """Tests running an unpicklable closure on the thread backend."""
+
+        def closure_worker(first, second):
+            self.track_concurrency(1)
+            time.sleep(0.05)
+            self.track_concurrency(-1)
+            return (first, second)
+
+        failed_tasks = do_multicore_work(
+            closure_worker,
+            args=zip(NUMBERS, LETTERS),
+            worker_done_callback=self.worker_done_callback,
+            backend="thread",
+            max_workers=2,
+        )
+        self.assertEqual(failed_tasks, [])
+        self.assertEqual(set(self.results), set(COMBINED))
+        self.assertLessEqual(self.max_active, 2)
+
+    def test_thread_backend_retries(self):
+        """Tests that a retry becomes due while other tasks are still running."""
+        attempts = []
+
+        def flaky_closure(number):
+            attempts.append(number)
+            if number == 1 and attempts.count(1) == 1:
+                raise ValueError(number)
+            time.sleep(0.3 if number == 2 else 0)
+            return number
+
+        failed_tasks = do_multicore_work(
+            flaky_closure,
+            args=[(1,), (2,)],
+            worker_done_callback=self.worker_done_callback,
+            backend="thread",
+            max_workers=2,
+            retries=1,
+            retry_backoff=0.1,
+        )
+        self.assertEqual(failed_tasks, [])
+        self.assertEqual(self.results, [1, 2])  # Retry finishes before task 2
+        self.assertEqual(self.errors, [])
+
+    def test_thread_backend_timeout(self):
+        """Tests that a hung thread is abandoned while other tasks succeed."""
+        release = threading.Event()
+
+        def hanging_closure(number):
+            if number == 3:
+                release.wait()
+            return number
+
+        try:
+            failed_tasks = do_multicore_work(
+                hanging_closure,
+                args=zip(NUMBERS),
+                worker_done_callback=self.worker_done_callback,
+                backend="thread",
+                max_workers=2,
+                timeout=0.5,
+            )
+        finally:
+            release.set()
+        self.assertEqual(sorted(self.results), [1, 2, 4, 5])
+        self.assertEqual(len(failed_tasks), 1)
+        self.assertIsInstance(failed_tasks[0].error, TimeoutError)
+
+    def test_thread_backend_callback_exception(self):
+        """Tests that an exception in the callback shuts down the thread pool."""
+
+        def raising_callback(future):
+            raise RuntimeError("Callback failed.")
+
+        with self.assertRaises(RuntimeError):
+            do_multicore_work(
+                worker,
+                args=zip(NUMBERS, LETTERS),
+                worker_done_callback=raising_callback,
+                backend="thread",
+            )
+
+    def test_asyncio_backend(self):
+        """Tests running a coroutine worker with a concurrency limit."""
+
+        async def tracking_worker(first, second):
+            self.track_concurrency(1)
+            await asyncio.sleep(0.05)
+            self.track_concurrency(-1)
+            return (first, second)
+
+        for test_worker in (async_worker, tracking_worker):
+            with self.subTest(worker=test_worker.__name__):
+                self.setUp()
+                failed_tasks = do_multicore_work(
+                    test_worker,
+                    kwargs=[{"first": x, "second": y} for x, y in COMBINED],
+                    worker_done_callback=self.worker_done_callback,
+                    backend="asyncio",
+                    max_workers=2,
+                )
+                self.assertEqual(failed_tasks, [])
+                self.assertEqual(set(self.results), set(COMBINED))
+        self.assertEqual(self.max_active, 2)
+
+    def test_asyncio_backend_timeout_and_retries(self):
+        """Tests timing out and retrying coroutine workers."""
+        attempts = []
+
+        async def flaky_worker(number):
+            attempts.append(number)
+            if number == 3:
+                await asyncio.sleep(60)
+            if number == 4:
+                raise ValueError(number)
+            return number
+
+        start = time.monotonic()
+        failed_tasks = do_multicore_work(
+            flaky_worker,
+            args=zip(NUMBERS),
+            worker_done_callback=self.worker_done_callback,
+            backend="asyncio",
+            max_workers=5,
+            timeout=0.2,
+            retries=1,
+            retry_backoff=0.1,
+        )
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(sorted(self.results), [1, 2, 5])
+        self.assertEqual(sorted(attempts), [1, 2, 3, 3, 4, 4, 5])
+        errors = {task.args: (type(task.error), task.attempts) for task in failed_tasks}
+        self.assertEqual(errors, {(3,): (TimeoutError, 2), (4,): (ValueError, 2)})
+        self.assertEqual(len(self.errors), 2)
+
+    def test_asyncio_backend_callback_exception(self):
+        """Tests that an exception in the callback cancels the remaining tasks."""
+
+        def raising_callback(future):
+            raise RuntimeError("Callback failed.")
+
+        with self.assertRaises(RuntimeError):
+            do_multicore_work(
+                async_worker,
+                args=zip(NUMBERS, LETTERS),
+                worker_done_callback=raising_callback,
+                backend="asyncio",
+            )
+
+
+class ProgressTest(unittest.TestCase):
+    """
+    Tests progress, throughput and latency statistics.
+    """
+
+    def setUp(self) -> None:
+        self.stats = []
+
+    def test_process_backend_stats(self):
+        """Tests reporting statistics through a callback and a file."""
+        with tempfile.TemporaryDirectory() as td:
+            stats_file = os.path.join(td, "stats.json")
+            do_multicore_work(
+                worker,
+                args=list(zip(NUMBERS, LETTERS)),
+                progress_callback=self.stats.append,
+                stats_file=stats_file,
+                stats_interval=0,
+            )
+            with open(stats_file) as f:
+                file_stats = json.load(f)
+        first, final = self.stats[0], self.stats[-1]
+        self.assertIsInstance(final, WorkStats)
+        self.assertEqual(first.latency_p50, None)  # Reported before any task is done
+        self.assertEqual((final.done, final.failed, final.total), (5, 0, 5))
+        self.assertEqual((final.running, final.waiting), (0, 0))
+        self.assertEqual(final.eta, 0)
+        self.assertGreater(final.throughput, 0)
+        self.assertGreater(final.utilization, 0)
+        self.assertLessEqual(final.latency_p50, final.latency_p99)
+        self.assertGreater(len(final.worker_utilization), 0)
+        self.assertEqual(file_stats["done"], 5)
+        self.assertEqual(file_stats["total"], 5)
+
+    def test_thread_backend_stats(self):
+        """Tests counting failures and retries when the total is unknown."""
+        attempts = []
+
+        def flaky_closure(number):
+            attempts.append(number)
+            if number == 1 and attempts.count(1) == 1:
+                raise ValueError(number)  # Succeeds on retry
+            if number == 2:
+                raise ValueError(number)  # Always fails
+            return number
+
+        do_multicore_work(
+            flaky_closure,
+            args=zip(NUMBERS),
+            backend="thread",
+            max_workers=1,
+            retries=1,
+            retry_backoff=0.1,
+            progress_callback=self.stats.append,
+            stats_interval=0.01,
+        )
+        final = self.stats[-1]
+        self.assertEqual((final.done, final.failed, final.total), (5, 1, None))
+        self.assertIsNone(final.eta)
+        self.assertTrue(any(stats.waiting for stats in self.stats))
+
+    def test_asyncio_backend_stats(self):
+        """Tests reporting statistics on the asyncio backend."""
+        attempts = []
+
+        async def sleeping_worker(number):
+            attempts.append(number)
+            await asyncio.sleep(0.05)
+            if number == 1 and attempts.count(1) == 1:
+                raise ValueError(number)
+            return number
+
+        do_multicore_work(
+            sleeping_worker,
+            args=zip(NUMBERS),
+            backend="asyncio",
+            max_workers=2,
+            retries=1,
+            retry_backoff=0.05,
+            total=5,
+            progress_callback=self.stats.append,
+            stats_interval=0.01,
+        )
+        final = self.stats[-1]
+        self.assertGreater(len(self.stats), 1)  # Periodic and final report
+        self.assertEqual((final.done, final.failed, final.total), (5, 0, 5))
+        self.assertEqual(len(final.worker_utilization), 2)
+        self.assertTrue(any(stats.running for stats in self.stats))
+        self.assertGreaterEqual(final.latency_p50, 0.05)
+
+
+class CheckpointTest(unittest.TestCase):
+    """
+    Tests resuming work from a checkpoint journal.
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.checkpoint_file = os.path.join(self.temp_dir.name, "journal.pickle")
+        self.calls = []
+        self.results = []
+        self.failing = {3}
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def closure_worker(self, number):
+        """Records the call and fails for numbers in self.failing."""
+        self.calls.append(number)
+        if number in self.failing:
+            raise ValueError(number)
+        return number * 10
+
+    async def async_closure_worker(self, number):
+        """Coroutine version of closure_worker."""
+        return self.closure_worker(number)
+
+    def worker_done_callback(self, future):
+        """Records results of successful workers."""
+        if future.exception() is None:
+            self.results.append(future.result())
+
+    def run_work(self, **kwargs):
+        """Runs the closure worker on all numbers with a checkpoint."""
+        kwargs.setdefault("backend", "thread")
+        worker = (
+            self.async_closure_worker
+            if kwargs["backend"] == "asyncio"
+            else self.closure_worker
+        )
+        self.calls.clear()
+        self.results.clear()
+        return do_multicore_work(
+            worker,
+            args=zip(NUMBERS),
+            worker_done_callback=self.worker_done_callback,
+            checkpoint_file=self.checkpoint_file,
+            **kwargs,
+        )
+
+    def test_resume(self):
+        """Tests that completed tasks are skipped when the work is rerun."""
+        for backend in ("thread", "asyncio"):
+            with self.subTest(backend=backend):
+                self.setUp()
+                self.run_work(backend=backend)
+                self.assertEqual(sorted(self.calls), [1, 2, 3, 4, 5])
+                self.failing.clear()
+                failed_tasks = self.run_work(backend=backend)
+                self.assertEqual(failed_tasks, [])
+                self.assertEqual(self.calls, [3])  # Only the failed task is rerun
+                self.assertEqual(self.results, [30])  # No results are stored
+                self.run_work(backend=backend)
+                self.assertEqual(self.calls, [])  # Nothing left to do
+                self.tearDown()
+
+    def test_resume_with_results(self):
+        """Tests reporting stored results of completed tasks when resuming."""
+        self.run_work(checkpoint_results=True)
+        self.failing.clear()
+        self.run_work(checkpoint_results=True)
+        self.assertEqual(self.calls, [3])
+        self.assertEqual(sorted(self.results), [10, 20, 30, 40, 50])
+
+    def test_resume_with_progress(self):
+        """Tests that the progress total only counts the remaining tasks."""
+        stats = []
+        self.run_work()
+        self.run_work(total=len(NUMBERS), progress_callback=stats.append)
+        self.assertEqual((stats[-1].done, stats[-1].total), (1, 1))
+
+    def test_resume_process_backend(self):
+        """Tests the checkpoint on the process backend."""
+        with open(self.checkpoint_file, "wb") as f:
+            f.write(b"\x80")  # A partially written entry left behind by a crash
+        do_multicore_work(
+            worker,
+            args=list(zip(NUMBERS, LETTERS)),
+            checkpoint_file=self.checkpoint_file,
+        )
+        self.results.clear()
+        do_multicore_work(
+            worker,
+            args=list(zip(NUMBERS, LETTERS)),
+            worker_done_callback=self.worker_done_callback,
+            checkpoint_file=self.checkpoint_file,
+        )
+        self.assertEqual(self.results, [])  # Nothing left to do
+
+
+class PmapChunksTest(unittest.TestCase):
+    """
+    Tests processing chunks of an iterable with pmap_chunks.
+    """
+
+    def test_backends(self):
+        """Tests that results are returned in the order of the chunks."""
+        expected = [sum(range(i, min(i + 3, 20))) for i in range(0, 20, 3)]
+        for backend, worker in (
+            ("process", sum),
+            ("thread", sum),
+            ("asyncio", async_sum),
+        ):
+            with self.subTest(backend=backend):
+                results = pmap_chunks(
+                    worker, iter(range(20)), 3, backend=backend, max_workers=2
+                )
+                self.assertEqual(results, expected)
+
+    def test_overlaps_reading_and_processing(self):
+        """Tests that chunks are read while the workers process earlier chunks."""
+        events = []
+
+        def slow_source():
+            for i in range(4):
+                events.append(f"read {i}")
+                yield i
+
+        def slow_worker(chunk):
+            time.sleep(0.1)
+            events.append(f"processed {chunk}")
+            return chunk
+
+        results = pmap_chunks(
+            slow_worker, slow_source(), 1, backend="thread", max_workers=1
+        )
+        self.assertEqual(results, [[0], [1], [2], [3]])
+        # All items were read ahead while the first chunk was being processed
+        self.assertLess(events.index("read 3"), events.index("processed [1]"))
+
+    def test_failure(self):
+        """Tests raising the error of the first failed chunk."""
+        with self.assertRaises(ValueError) as ctx:
+            pmap_chunks(odd_chunk_worker, [2, 2, 1, 2, 3], 1, backend="thread")
+        self.assertEqual(ctx.exception.args, ([1],))
+        self.assertEqual(pmap_chunks(odd_chunk_worker, [], 2, backend="thread"), [])
+
+    def test_checkpoint(self):
+        """Tests resuming from a checkpoint, restoring the results of chunks done."""
+        calls = []
+
+        def sum_worker(chunk):
+            calls.append(chunk)
+            return sum(chunk)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            checkpoint_file = os.path.join(temp_dir, "journal.pickle")
+            with self.assertRaises(ValueError):
+                pmap_chunks(
+                    odd_chunk_worker,
+                    [2, 2, 1, 2, 3],
+                    1,
+                    backend="thread",
+                    checkpoint_file=checkpoint_file,
+                )
+            results = pmap_chunks(
+                sum_worker,
+                [2, 2, 1, 2, 3],
+                1,
+                backend="thread",
+                checkpoint_file=checkpoint_file,
+            )
+        self.assertEqual(results, [2, 2, 1, 2, 3])
+        self.assertEqual(sorted(calls), [[1], [3]])
+
+
+class SweepTest(unittest.TestCase):
+    """
+    Tests running parameter sweeps.
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.grid = Permutations(x=[6, 12], y=[0, 1, 2, 3])
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_backends(self):
+        """Tests that the rows hold the parameters, results and runtimes."""
+        for backend, function in (
+            ("process", divide),
+            ("thread", divide),
+            ("asyncio", async_divide),
+        ):
+            with self.subTest(backend=backend):
+                rows = sweep(function, self.grid, backend=backend, max_workers=2)
+                self.assertEqual([row["index"] for row in rows], list(range(8)))
+                self.assertEqual(
+                    [row["result"] for row in rows], [None, 6, 3, 2, None, 12, 6, 4]
+                )
+                self.assertEqual(rows[5]["x"], 12)
+                self.assertEqual(rows[5]["y"], 1)
+                self.assertIsInstance(rows[0]["error"], ZeroDivisionError)
+                self.assertIsNone(rows[0]["runtime"])
+                self.assertIsNone(rows[1]["error"])
+                self.assertGreaterEqual(rows[1]["runtime"], 0)
+
+    def test_output_files(self):
+        """Tests streaming the rows to CSV and pickle files."""
+        csv_file = os.path.join(self.temp_dir.name, "results.csv")
+        pickle_file = os.path.join(self.temp_dir.name, "results.pickle")
+        rows = sweep(divide, self.grid[1:3], csv_file, backend="thread")
+        with open(csv_file, newline="") as f:
+            csv_rows = list(csv.DictReader(f))
+        self.assertEqual(list(csv_rows[0]), list(rows[0]))
+        self.assertEqual(sorted(row["result"] for row in csv_rows), ["3", "6"])
+        rows = sweep(divide, self.grid, pickle_file, backend="thread")
+        self.assertEqual(
+            sorted(map(repr, iter_unpickle(pickle_file))), sorted(map(repr, rows))
+        )
+        sweep(divide, self.grid[:0], csv_file, backend="thread")
+        with open(csv_file) as f:
+            self.assertEqual(f.read(), "")
+
+    def test_early_stopping_and_resume(self):
+        """Tests stopping the sweep early and resuming it from a checkpoint."""
+        calls = []
+
+        def function(x, y):
+            calls.append((x, y))
+            return x * y
+
+        checkpoint_file = os.path.join(self.temp_dir.name, "journal.pickle")
+        rows = sweep(
+            function,
+            self.grid,
+            stop_condition=lambda rows: rows[-1]["result"] >= 12,
+            checkpoint_file=checkpoint_file,
+            backend="thread",
+            max_workers=1,
+        )
+        self.assertEqual([row["result"] for row in rows], [0, 6, 12])
+        calls.clear()
+        rows = sweep(
+            function, self.grid, checkpoint_file=checkpoint_file, backend="thread"
+        )
+        self.assertEqual([row["result"] for row in rows], [0, 6, 12, 18, 0, 12, 24, 36])
+        self.assertEqual(len(calls), 5)  # Completed runs are not repeated
+
+
+class CpuTopologyTest(unittest.TestCase):
+    """
+    Tests CPU topology and thread limiting utilities.
+    """
+
+    def test_available_cpus(self):
+        """Tests that available CPUs are a non-empty sorted list of CPU ids."""
+        cpus = available_cpus()
+        self.assertGreater(len(cpus), 0)
+        self.assertEqual(cpus, sorted(cpus))
+        with mock.patch("jacktrade.multicore.os") as mock_os:
+            del mock_os.sched_getaffinity  # Simulate an OS without affinity support
+            mock_os.cpu_count.return_value = 3
+            self.assertEqual(available_cpus(), [0, 1, 2])
+
+    def test_parse_cpu_list(self):
+        """Tests parsing Linux CPU list strings."""
+        self.assertEqual(_parse_cpu_list("0-3,8,10-11\n"), [0, 1, 2, 3, 8, 10, 11])
+        self.assertEqual(_parse_cpu_list(""), [])
+
+    def test_numa_nodes(self):
+        """Tests reading NUMA nodes from a sysfs-like directory tree."""
+        cpus = available_cpus()
+        with tempfile.TemporaryDirectory() as td:
+            with mock.patch("jacktrade.multicore.NUMA_NODES_DIR", td):
+                # No nodes found
+                self.assertEqual(numa_nodes(), [cpus])
+                # Every available CPU on node 1, none on node 0
+                for node, cpu_list in ((0, "99999"), (1, ",".join(map(str, cpus)))):
+                    os.mkdir(node_dir := os.path.join(td, f"node{node}"))
+                    with open(os.path.join(node_dir, "cpulist"), "w") as f:
+                        f.write(cpu_list)
+                self.assertEqual(numa_nodes(), [cpus])
+                # Unreadable topology
+                os.mkdir(os.path.join(td, "node2"))
+                self.assertEqual(numa_nodes(), [cpus])
+
+    @mock.patch("jacktrade.multicore.numa_nodes", return_value=[[0, 2], [1, 3]])
+    @mock.patch("jacktrade.multicore.available_cpus", return_value=[0, 1, 2, 3])
+    def test_assign_worker_cpus(self, *_):
+        """Tests assigning distinct CPUs to workers on interleaved NUMA nodes."""
+        # Parameters are (n_workers, numa_aware, expected CPUs)
+        test_params = [
+            (4, False, [0, 1, 2, 3]),
+            (4, True, [0, 2, 1, 3]),  # Node 0 is filled before node 1
+            (2, False, [0, 1]),
+            (2, True, [0, 2]),  # Both workers are on node 0
+            (6, False, [0, 1, 2, 3, 0, 1]),  # More workers than CPUs
+            (6, True, [0, 2, 1, 3, 0, 2]),
+        ]
+        for n_workers, numa_aware, expected in test_params:
+            with self.subTest(n_workers=n_workers, numa_aware=numa_aware):
+                cpus = _assign_worker_cpus(n_workers, numa_aware)
+                self.assertEqual(cpus, expected)
+
+    @unittest.skipUnless(hasattr(os, "sched_setaffinity"), "CPU affinity unsupported")
+    def test_pin_worker(self):
+        """Tests the worker initialiser which pins the process to a CPU."""
+        original_cpus = os.sched_getaffinity(0)
+        cpu_queue = mock.Mock(get=mock.Mock(return_value=available_cpus()[-1]))
+        try:
+            _pin_worker(cpu_queue)
+            self.assertEqual(os.sched_getaffinity(0), {available_cpus()[-1]})
+        finally:
+            os.sched_setaffinity(0, original_cpus)
+
+    def test_limit_threads(self):
+        """Tests temporarily setting thread limit environment variables."""
+        var_set, var_unset = THREAD_LIMIT_ENV_VARS[:2]
+        with mock.patch.dict(os.environ, {var_set: "8"}):
+            os.environ.pop(var_unset, None)
+            with limit_threads(2):
+                self.assertEqual(os.environ[var_set], "2")
+                self.assertEqual(os.environ[var_unset], "2")
+            self.assertEqual(os.environ[var_set], "8")
+            self.assertNotIn(var_unset, os.environ)
+            with limit_threads(None):
+                self.assertEqual(os.environ[var_set], "8")
 
 
 if __name__ == "__main__":
@@ -1,8 +1,44 @@
 import os.path
+import pickle
 import tempfile
+import threading
+import time
 import unittest
 
-from jacktrade import pickle_object, unpickle_object
+from jacktrade import (
+    append_pickle,
+    disk_cache,
+    iter_unpickle,
+    pickle_object,
+    pickle_objects,
+    unpickle_object,
+    unpickle_objects,
+)
+from jacktrade.pickler import (
+    _HEADER,
+    _SEGMENT,
+    BUFFER_ALIGNMENT,
+    COMPRESSORS,
+    OUT_OF_BAND_MIN_SIZE,
+    _FileLock,
+)
+
+
+class Unpicklable:
+    """Raises an exception when pickled."""
+
+    def __reduce__(self):
+        raise RuntimeError("Cannot pickle.")
+
+
+class ZeroCopyBuffer:
+    """Holds a buffer which is pickled out-of-band and unpickled without copying."""
+
+    def __init__(self, buffer):
+        self.view = memoryview(buffer)
+
+    def __reduce_ex__(self, protocol):
+        return type(self), (pickle.PickleBuffer(self.view),)
 
 
 class PickerTest(unittest.TestCase):
@@ -18,6 +54,325 @@ class PickerTest(unittest.TestCase):
             pickle_object(obj, filename)
             self.assertEqual(unpickle_object(filename), obj)
 
+    def test_default_protocol(self):
+        """Tests that protocol 5 is used by default."""
+        with tempfile.TemporaryDirectory() as td:
+            filename = os.path.join(td, "obj.pickle")
+            pickle_object([1, 2, 3], filename)
+            with open(filename, "rb") as f:
+                self.assertEqual(f.read(2), b"\x80\x05")
+
+    def test_compression(self):
+        """Tests pickling with compression and detecting it when unpickling."""
+        obj = list(range(1000))
+        with tempfile.TemporaryDirectory() as td:
+            filename = os.path.join(td, "obj.pickle")
+            pickle_object(obj, filename)
+            uncompressed_size = os.path.getsize(filename)
+            for compression in COMPRESSORS:
+                with self.subTest(compression=compression):
+                    pickle_object(obj, filename, compression=compression)
+                    self.assertLess(os.path.getsize(filename), uncompressed_size)
+                    self.assertEqual(unpickle_object(filename), obj)
+
+    def test_invalid_compression(self):
+        """Tests that an unknown compression is rejected."""
+        with tempfile.TemporaryDirectory() as td:
+            with self.assertRaises(ValueError):
+                pickle_object([1], os.path.join(td, "obj.pickle"), compression="zip")
+
+    def test_atomic_write(self):
+        """Tests that a failed write leaves the existing file intact."""
+        with tempfile.TemporaryDirectory() as td:
+            filename = os.path.join(td, "obj.pickle")
+            pickle_object([1, 2, 3], filename)
+            with self.assertRaises(RuntimeError):
+                pickle_object([4, Unpicklable()], filename)
+            self.assertEqual(unpickle_object(filename), [1, 2, 3])
+            self.assertEqual(os.listdir(td), ["obj.pickle"])  # No temporary files
+
+    def test_out_of_band(self):
+        """Tests pickling large buffers out-of-band and loading them back."""
+        large = bytes(range(256)) * (OUT_OF_BAND_MIN_SIZE // 256 + 1)
+        obj = {
+            "large": [ZeroCopyBuffer(bytearray(large)), ZeroCopyBuffer(large[:-7])],
+            "small": ZeroCopyBuffer(bytearray(b"abc")),  # Kept in-band
+            "other": [1, "2"],
+        }
+        with tempfile.TemporaryDirectory() as td:
+            filename = os.path.join(td, "obj.pickle")
+            pickle_object(obj, filename, out_of_band=True)
+            # Buffers are stored as aligned segments
+            with open(filename, "rb") as f:
+                _, _, n_buffers = _HEADER.unpack(f.read(_HEADER.size))
+                segments = [_SEGMENT.unpack(f.read(_SEGMENT.size)) for _ in range(2)]
+            self.assertEqual(n_buffers, 2)
+            for offset, _ in segments:
+                self.assertEqual(offset % BUFFER_ALIGNMENT, 0)
+            for mmap_buffers in (False, True):
+                with self.subTest(mmap_buffers=mmap_buffers):
+                    loaded = unpickle_object(filename, mmap_buffers=mmap_buffers)
+                    self.assertEqual(loaded["large"][0].view, large)
+                    self.assertEqual(loaded["large"][1].view, large[:-7])
+                    self.assertEqual(loaded["small"].view, b"abc")
+                    self.assertEqual(loaded["other"], [1, "2"])
+                    backing_type = type(loaded["large"][0].view.obj)
+                    self.assertEqual(backing_type.__name__ == "mmap", mmap_buffers)
+                    del loaded  # Release the mapping before the file is deleted
+
+    def test_out_of_band_without_buffers(self):
+        """Tests the out-of-band format when there are no large buffers."""
+        with tempfile.TemporaryDirectory() as td:
+            filename = os.path.join(td, "obj.pickle")
+            pickle_object([1, 2, 3], filename, out_of_band=True)
+            self.assertEqual(unpickle_object(filename, mmap_buffers=True), [1, 2, 3])
+
+    def test_highest_protocol(self):
+        """Tests that None and negative protocols select the highest protocol."""
+        with tempfile.TemporaryDirectory() as td:
+            filename = os.path.join(td, "obj.pickle")
+            for protocol in (None, -1):
+                for out_of_band in (False, True):
+                    with self.subTest(protocol=protocol, out_of_band=out_of_band):
+                        pickle_object([1], filename, protocol, out_of_band=out_of_band)
+                        self.assertEqual(unpickle_object(filename), [1])
+
+    def test_out_of_band_invalid_options(self):
+        """Tests that out-of-band pickling rejects incompatible options."""
+        with tempfile.TemporaryDirectory() as td:
+            filename = os.path.join(td, "obj.pickle")
+            for options in ({"compression": "gzip"}, {"protocol": 4}):
+                with self.subTest(**options):
+                    with self.assertRaises(ValueError):
+                        pickle_object([1], filename, out_of_band=True, **options)
+
+    def test_append_and_iter_unpickle(self):
+        """Tests appending multiple objects to a file and reading them back."""
+        with tempfile.TemporaryDirectory() as td:
+            filename = os.path.join(td, "objs.pickle")
+            for obj in ([1, 2], "abc", None):
+                append_pickle(obj, filename)
+            self.assertEqual(list(iter_unpickle(filename)), [[1, 2], "abc", None])
+
+    def test_iter_unpickle_truncated(self):
+        """Tests ignoring and repairing a truncated object at the end of the file."""
+        with tempfile.TemporaryDirectory() as td:
+            filename = os.path.join(td, "objs.pickle")
+            append_pickle([1, 2], filename)
+            with open(filename, "ab") as f:
+                f.write(pickle.dumps(list(range(100)))[:-10])  # Crash mid-write
+            self.assertEqual(list(iter_unpickle(filename)), [[1, 2]])
+            self.assertEqual(list(iter_unpickle(filename, repair=True)), [[1, 2]])
+            append_pickle("abc", filename)
+            self.assertEqual(list(iter_unpickle(filename)), [[1, 2], "abc"])
+
+
+class BulkPicklerTest(unittest.TestCase):
+    """
+    Tests pickling and unpickling many objects in parallel.
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.objects = {
+            os.path.join(self.temp_dir.name, f"{i}.pickle"): list(range(i))
+            for i in range(20)
+        }
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_pickle_unpickle_objects(self):
+        """Tests a round trip on each backend."""
+        for backend in ("thread", "process"):
+            with self.subTest(backend=backend):
+                pickle_objects(self.objects, compression="gzip", backend=backend)
+                for filename, obj in self.objects.items():
+                    self.assertEqual(unpickle_object(filename), obj)
+                filenames = list(reversed(self.objects))
+                objects = unpickle_objects(filenames, backend=backend, max_workers=4)
+                self.assertEqual(list(objects), filenames)  # Order is kept
+                self.assertEqual(objects, self.objects)
+
+    def test_unpickle_objects_stream(self):
+        """Tests streaming objects as they are unpickled."""
+        pickle_objects(self.objects)
+        results = unpickle_objects(iter(self.objects), stream=True)
+        self.assertEqual(dict(results), self.objects)
+        # Stopping early cancels the remaining files
+        results = unpickle_objects(self.objects, stream=True, max_workers=1)
+        filename, obj = next(results)
+        self.assertEqual(obj, self.objects[filename])
+        results.close()
+
+    def test_errors(self):
+        """Tests that errors in any of the files are raised."""
+        with self.assertRaises(ValueError):
+            pickle_objects(self.objects, backend="asyncio")
+        with self.assertRaises(ValueError):
+            unpickle_objects(self.objects, backend="asyncio")
+        bad_filename = os.path.join(self.temp_dir.name, "bad.pickle")
+        with self.assertRaises(RuntimeError):
+            pickle_objects({**self.objects, bad_filename: Unpicklable()})
+        self.assertFalse(os.path.exists(bad_filename))
+        pickle_objects(self.objects)
+        with self.assertRaises(FileNotFoundError):
+            unpickle_objects([*self.objects, "missing.pickle"])
+
+
+class DiskCacheTest(unittest.TestCase):
+    """
+    Tests the disk_cache decorator.
+    """
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.temp_dir.name, "cache")
+        self.calls = []
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def cached_square(self, **cache_kwargs):
+        """Returns a cached function squaring a number and recording its calls."""
+
+        @disk_cache(self.cache_dir, **cache_kwargs)
+        def square(x, power=2):
+            self.calls.append(x)
+            return x**power
+
+        return square
+
+    def cache_files(self) -> list[str]:
+        """Returns the names of cached result files."""
+        return [f for f in os.listdir(self.cache_dir) if f.endswith(".pickle")]
+
+    def test_hits_and_misses(self):
+        """Tests that repeated calls are served from the cache."""
+        square = self.cached_square()
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square(x=3, power=3), 27)
+        self.assertEqual(square(power=3, x=3), 27)
+        self.assertEqual(self.calls, [3, 3])
+        self.assertEqual((square.hits, square.misses), (2, 2))
+        self.assertEqual(len(self.cache_files()), 2)
+
+    def test_persistence(self):
+        """Tests that results are reused by a newly decorated function."""
+        self.cached_square()(4)
+        square = self.cached_square(compression="gzip")
+        self.assertEqual(square(4), 16)
+        self.assertEqual(self.calls, [4])
+        self.assertEqual((square.hits, square.misses), (1, 0))
+
+    def test_code_change_invalidates_cache(self):
+        """Tests that functions with the same name but different code do not collide."""
+        namespace = {"disk_cache": disk_cache, "cache_dir": self.cache_dir}
+        for body in ("x + 1", "x + 2"):  # No source available for exec'd functions
+            exec(f"@disk_cache(cache_dir)\ndef f(x):\n    return {body}", namespace)
+            self.assertEqual(namespace["f"](1), eval(body, {"x": 1}))
+
+    def test_max_age(self):
+        """Tests recomputing results older than max_age."""
+        square = self.cached_square(max_age=0.2)
+        square(2)
+        square(2)
+        time.sleep(0.3)
+        square(2)
+        self.assertEqual(self.calls, [2, 2])
+        square(3)  # Evicts the expired result of square(2)
+        time.sleep(0.3)
+        square(4)
+        self.assertEqual(len(self.cache_files()), 1)
+
+    def test_max_size(self):
+        """Tests evicting the least recently used results when the cache is full."""
+        square = self.cached_square()
+        square(1)
+        size = os.path.getsize(os.path.join(self.cache_dir, self.cache_files()[0]))
+        square = self.cached_square(max_size=2 * size)
+        for x in (2, 1, 3):  # 2 is used least recently by the time 3 is added
+            square(x)
+            time.sleep(0.01)
+        self.assertEqual(len(self.cache_files()), 2)
+        self.calls.clear()
+        square(1)
+        square(3)
+        square(2)
+        self.assertEqual(self.calls, [2])
+
+    def test_cache_clear(self):
+        """Tests deleting all cached results."""
+        square = self.cached_square()
+        square(1)
+        square.cache_clear()
+        self.assertEqual(self.cache_files(), [])
+        square(1)
+        self.assertEqual(self.calls, [1, 1])
+
+    def test_corrupt_cache_file(self):
+        """Tests that an unreadable cache file is treated as a miss."""
+        square = self.cached_square()
+        square(5)
+        with open(os.path.join(self.cache_dir, self.cache_files()[0]), "wb") as f:
+            f.write(b"\x80\x05")  # Truncated
+        self.assertEqual(square(5), 25)
+        self.assertEqual(self.calls, [5, 5])
+
+    def test_concurrent_calls(self):
+        """Tests that concurrent calls with the same arguments compute only once."""
+
+        @disk_cache(self.cache_dir)
+        def slow_square(x):
+            self.calls.append(x)
+            time.sleep(0.2)
+            return x**2
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(slow_square(6)))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [36, 36, 36])
+        self.assertEqual(self.calls, [6])
+        self.assertEqual((slow_square.hits, slow_square.misses), (2, 1))
+
+    def test_stale_lock(self):
+        """Tests breaking a lock abandoned by a crashed process."""
+        square = self.cached_square(lock_timeout=1)
+        square(7)
+        (cache_file,) = self.cache_files()
+        square.cache_clear()
+        lock_file = os.path.join(self.cache_dir, cache_file[: -len(".pickle")])
+        with open(lock_file := f"{lock_file}.lock", "w"):
+            pass
+        os.utime(lock_file, (0, 0))  # Left behind long ago
+        self.assertEqual(square(7), 49)
+        self.assertEqual(self.calls, [7, 7])
+        self.assertFalse(os.path.exists(lock_file))
+
+    def test_stale_lock_race(self):
+        """Tests that a lock re-acquired since found stale is not broken."""
+        os.makedirs(self.cache_dir)
+        lock_file = os.path.join(self.cache_dir, "race.lock")
+        with open(lock_file, "w"):
+            pass
+        stale = os.stat(lock_file)
+        with open(fresh_file := f"{lock_file}.fresh", "w"):
+            pass
+        os.replace(fresh_file, lock_file)  # Broken and re-acquired by another process
+        fresh = os.stat(lock_file)
+        self.assertFalse(_FileLock(lock_file, 1)._break(stale))
+        self.assertTrue(os.path.samestat(os.stat(lock_file), fresh))
+        self.assertEqual(os.listdir(self.cache_dir), ["race.lock"])
+        self.assertTrue(_FileLock(lock_file, 1)._break(fresh))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
 
 if __name__ == "__main__":
     unittest.main()